@@ -0,0 +1,150 @@
+""" Fast graph analytics on a CSR adjacency matrix.
+    All eccentricities are computed in one pass of breadth first searches
+    (scipy.sparse.csgraph, batched so only batch_size rows of the distance
+    matrix exist at a time, optionally spread over worker processes).
+    Diameter, radius, center and periphery are then read off the
+    eccentricities instead of each running its own all pairs computation.
+    Degree assortativity is computed directly from the edge arrays.
+
+    For components too large for all eccentricities, getBoundedDistanceMeasures
+    keeps a lower and upper eccentricity bound per node and only runs BFS from
+    the nodes that can still change the diameter or radius (the
+    BoundingDiameters algorithm of Takes and Kosters, 2011). It stops when the
+    bounds meet or a time budget runs out, and reports the bounds either way.
+
+    Results match nx.diameter, nx.radius, nx.center, nx.periphery and
+    nx.degree_assortativity_coefficient on connected graphs.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import time
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+
+class AnalyticsEngine:
+    def __init__(self, G):
+        self.G = G
+        self.nodelist = list(G.nodes())
+        self.A = nx.to_scipy_sparse_array(G, nodelist=self.nodelist, weight=None, format='csr')
+        self.__eccentricities = None
+
+    ##################
+    # Public Methods #
+    ##################
+    def getEccentricities(self, batch_size=512, processes=1):
+        """ Array of eccentricities aligned with self.nodelist """
+        if self.__eccentricities is None:
+            batches = [np.arange(start, min(start + batch_size, len(self.nodelist)))
+                       for start in range(0, len(self.nodelist), batch_size)]
+            directed = self.G.is_directed()
+            if processes > 1 and len(batches) > 1:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    results = list(pool.map(_batchEccentricities, [self.A] * len(batches), batches,
+                                            [directed] * len(batches)))
+            else:
+                results = [_batchEccentricities(self.A, batch, directed) for batch in batches]
+            eccentricities = np.concatenate(results) if len(results) > 0 else np.zeros(0)
+            if np.isinf(eccentricities).any():
+                raise nx.NetworkXError("Found infinite path length because the graph is not connected")
+            self.__eccentricities = eccentricities.astype(np.int64)
+        return self.__eccentricities
+
+    def getDistanceMeasures(self, batch_size=512, processes=1):
+        """ Diameter, radius, center and periphery from one eccentricity pass """
+        eccentricities = self.getEccentricities(batch_size, processes)
+        diameter = int(eccentricities.max())
+        radius = int(eccentricities.min())
+        return {'diameter': diameter,
+                'radius': radius,
+                'center': [self.nodelist[i] for i in np.flatnonzero(eccentricities == radius)],
+                'periphery': [self.nodelist[i] for i in np.flatnonzero(eccentricities == diameter)]}
+
+    def getBoundedDistanceMeasures(self, time_budget=None, max_bfs=None):
+        """ Lower and upper bounds on diameter and radius from as few BFS runs as possible.
+            time_budget (seconds) and max_bfs stop the search early; the bounds are still valid.
+            'exact' is True when both pairs of bounds have met.
+        """
+        start = time.perf_counter()
+        num_nodes = len(self.nodelist)
+        ecc_lower = np.zeros(num_nodes, dtype=np.int64)
+        # No eccentricity in a connected graph exceeds the number of nodes minus one
+        ecc_upper = np.full(num_nodes, max(num_nodes - 1, 0), dtype=np.int64)
+        candidates = np.ones(num_nodes, dtype=bool)
+        degree = np.asarray(self.A.sum(axis=1)).ravel()
+        diameter_lower, diameter_upper = 0, max(num_nodes - 1, 0)
+        radius_lower, radius_upper = 0, max(num_nodes - 1, 0)
+        bfs_count = 0
+        pick_high = True
+        while candidates.any():
+            if diameter_lower == diameter_upper and radius_lower == radius_upper:
+                break
+            # Always run at least one BFS so the bounds are informative
+            if bfs_count > 0 and time_budget is not None and time.perf_counter() - start > time_budget:
+                break
+            if max_bfs is not None and bfs_count >= max_bfs:
+                break
+            # Alternate between the node most likely to be in the periphery and in the center,
+            # breaking ties by degree
+            indices = np.flatnonzero(candidates)
+            if pick_high:
+                order = np.lexsort((-degree[indices], -ecc_upper[indices]))
+            else:
+                order = np.lexsort((-degree[indices], ecc_lower[indices]))
+            source = indices[order[0]]
+            pick_high = not pick_high
+
+            distances = csgraph.shortest_path(self.A, method='D', directed=self.G.is_directed(),
+                                              unweighted=True, indices=[source])[0]
+            if np.isinf(distances).any():
+                raise nx.NetworkXError("Found infinite path length because the graph is not connected")
+            distances = distances.astype(np.int64)
+            bfs_count += 1
+            eccentricity = distances.max()
+            ecc_lower = np.maximum(ecc_lower, np.maximum(distances, eccentricity - distances))
+            ecc_upper = np.minimum(ecc_upper, eccentricity + distances)
+            ecc_lower[source] = ecc_upper[source] = eccentricity
+
+            diameter_lower, diameter_upper = int(ecc_lower.max()), int(ecc_upper.max())
+            radius_lower, radius_upper = int(ecc_lower.min()), int(ecc_upper.min())
+            # A node is done when it is resolved, or can neither raise the diameter nor be a center
+            resolved = ecc_lower == ecc_upper
+            irrelevant = (ecc_upper <= diameter_lower) & (ecc_lower > radius_upper)
+            candidates &= ~(resolved | irrelevant)
+        if not candidates.any():
+            diameter_upper = diameter_lower = int(ecc_lower.max())
+            radius_upper = int(ecc_upper.min())
+            radius_lower = radius_upper
+        return {'diameter': (diameter_lower, diameter_upper),
+                'radius': (radius_lower, radius_upper),
+                'exact': diameter_lower == diameter_upper and radius_lower == radius_upper,
+                'bfs_count': bfs_count,
+                'seconds': time.perf_counter() - start}
+
+    def getDegreeAssortativity(self):
+        """ Pearson correlation of the degrees at the two ends of every edge """
+        A = sparse.coo_matrix(self.A)
+        if self.G.is_directed():
+            # nx uses out-degree of the source and in-degree of the target
+            source_degree = np.asarray(self.A.sum(axis=1)).ravel()[A.row]
+            target_degree = np.asarray(self.A.sum(axis=0)).ravel()[A.col]
+        else:
+            # Every undirected edge appears in both orientations of the symmetric matrix.
+            # Self loops add 2 to the degree like in networkx.
+            degree = np.asarray(self.A.sum(axis=1)).ravel() + self.A.diagonal()
+            source_degree = degree[A.row]
+            target_degree = degree[A.col]
+        return float(np.corrcoef(source_degree, target_degree)[0, 1])
+
+
+def _batchEccentricities(A, batch, directed):
+    distances = csgraph.shortest_path(A, method='D', directed=directed, unweighted=True, indices=batch)
+    return distances.max(axis=1)
@@ -0,0 +1,755 @@
+# Benchmark.py. Timing comparisons for the graph construction code.
+# python Benchmark.py runs every comparison; python Benchmark.py pipeline --help profiles the pipeline stages,
+# and python Benchmark.py imports exits with an error when the graph modules import too slowly.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import networkx as nx
+import pandas as pd
+
+from AnalyticsEngine import AnalyticsEngine
+from CommunityEngine import CommunityEngine
+from GraphExporter import GraphExporter
+from DatabaseManager import DatabaseManager
+from DatasetGenerator import DatasetGenerator
+from GraphCache import GraphCache
+from GraphDatabaseManager_v2 import GraphManager
+from GraphWorker import GraphWorker, GraphWorkerClient
+from ImportBudget import getImportTime, headless_modules, import_time_budget
+from LayoutEngine import LayoutEngine
+from PipelineProfiler import PipelineProfiler
+from PreprocessingPipeline import PreprocessingPipeline
+from SchemaBuilder import SchemaBuilder
+
+
+def getEdgeWeights(G):
+    """ Dictionary from an undirected edge to its weight, independent of edge order """
+    return {frozenset((u, v)): d['weight'] for u, v, d in G.edges(data=True)}
+
+
+def benchmarkEdgeConstruction(file_name='datasets/suicide_rates_by_category.csv'):
+    """ Compare the row-by-row and the vectorized GraphManager edge construction """
+    start = time.perf_counter()
+    by_row = GraphManager(file_name, vectorized=False)
+    row_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = GraphManager(file_name, vectorized=True)
+    vectorized_time = time.perf_counter() - start
+
+    G_row = by_row.getGraph_of_Database()
+    G_vec = vectorized.getGraph_of_Database()
+    same_weights = getEdgeWeights(G_row) == getEdgeWeights(G_vec) and set(G_row.nodes()) == set(G_vec.nodes())
+    print("Edge construction on", file_name)
+    print("   row by row:  {:.3f} s".format(row_time))
+    print("   vectorized:  {:.3f} s".format(vectorized_time))
+    print("   speedup:     {:.1f}x".format(row_time / vectorized_time))
+    print("   identical weights:", same_weights)
+    return same_weights
+
+
+def getTwoStepEdges(G, node_set):
+    """ The all_pairs_shortest_path_length projection that ProjectionEngine replaced """
+    two_step_paths = dict(nx.all_pairs_shortest_path_length(G, cutoff=2))
+    edge_set = set()
+    for node_source in node_set:
+        for node_destination, length in two_step_paths[node_source].items():
+            if length == 2 and node_destination in node_set:
+                edge_set.add(frozenset((node_source, node_destination)))
+    return edge_set
+
+
+def benchmarkProjection(file_name='datasets/suicide_rates_by_category.csv', node_type='country, age, sex'):
+    """ Compare all pairs shortest paths against the sparse matrix projection """
+    graph_database = GraphManager(file_name)
+    G = graph_database.getGraph_of_Database()
+    node_set = graph_database.nodes_by_attribute_dict[node_type]
+
+    start = time.perf_counter()
+    old_edges = getTwoStepEdges(G, node_set)
+    old_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    P, node_list = graph_database.extractProjectionGraph(node_type, return_matrix=True)
+    matrix_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    H = graph_database.extractProjectionGraph(node_type)
+    graph_time = time.perf_counter() - start
+
+    same_edges = old_edges == {frozenset(edge) for edge in H.edges()}
+    print("Projection onto", node_type)
+    print("   all pairs shortest paths: {:.3f} s".format(old_time))
+    print("   sparse matrix:            {:.3f} s".format(matrix_time))
+    print("   sparse matrix + networkx: {:.3f} s".format(graph_time))
+    print("   projected edges:", len(old_edges), " identical:", same_edges)
+    return same_edges
+
+
+def benchmarkProjectionPruning(file_name='datasets/suicide_rates_by_category.csv',
+                               schemas=(([['country', 'age', 'sex'], ['suicides_per_100k_bins']], 'country, age, sex'),
+                                        ([['country', 'year', 'age', 'sex'], ['suicides_per_100k_bins'],
+                                          ['generation']], 'country, year, age, sex')),
+                               weight='product', options=({'min_weight': 900}, {'top_k': 10}, {'alpha': 0.05}),
+                               max_unpruned_nodes=5000):
+    """ Weighted projections pruned while they are generated: time, peak traced memory and edges """
+    for node_types, node_type in schemas:
+        graph_database = GraphManager(file_name, node_types=node_types, backend='compact')
+        num_nodes = len(graph_database.nodes_by_attribute_dict[node_type])
+        print("Pruned projection onto {} ({} nodes)".format(node_type, num_nodes))
+        runs = [dict()] if num_nodes <= max_unpruned_nodes else []
+        for pruning in runs + list(options):
+            tracemalloc.start()
+            start = time.perf_counter()
+            P, node_list = graph_database.extractProjectionGraph(node_type, weight=weight, return_matrix=True,
+                                                                 **pruning)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            # Every undirected edge is stored in both rows
+            print("   {:22s} {:10d} edges  {:7.3f} s  {:8.1f} MB peak".format(
+                str(pruning or 'unpruned'), P.nnz // 2, seconds, peak / 2 ** 20))
+
+
+def benchmarkCategoricalLoad(file_name='datasets/suicide_rates_by_category.csv'):
+    """ Memory and graph build time of the object and the categorical DatabaseManager load paths """
+    object_memory = DatabaseManager(file_name).getMemoryUsage()
+    categorical_memory = DatabaseManager(file_name, categorical=True).getMemoryUsage()
+
+    start = time.perf_counter()
+    object_graph = GraphManager(file_name).getGraph_of_Database()
+    object_time = time.perf_counter() - start
+    start = time.perf_counter()
+    categorical_graph = GraphManager(file_name, categorical=True).getGraph_of_Database()
+    categorical_time = time.perf_counter() - start
+
+    same_graph = getEdgeWeights(object_graph) == getEdgeWeights(categorical_graph)
+    print("DatabaseManager load paths on", file_name)
+    print("   object columns:      {:.2f} MB, graph built in {:.3f} s".format(object_memory / 1e6, object_time))
+    print("   categorical columns: {:.2f} MB, graph built in {:.3f} s".format(categorical_memory / 1e6, categorical_time))
+    print("   memory reduction:    {:.1f}x".format(object_memory / categorical_memory))
+    print("   identical weights:", same_graph)
+    return same_graph
+
+
+def benchmarkGraphCache(file_name='datasets/suicide_rates_by_category.csv'):
+    """ Cold build into an empty cache, warm load from it, and a rebuild after the binlist changes """
+    cache_dir = tempfile.mkdtemp(prefix='graph_cache_')
+    # A cold build reads and preprocesses the csv
+    PreprocessingPipeline.clearCache()
+    start = time.perf_counter()
+    cold = GraphManager(file_name, cache_dir=cache_dir)
+    cold_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    warm = GraphManager(file_name, cache_dir=cache_dir)
+    warm_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    GraphManager(file_name, binlist=[0, 50, 100, 300], cache_dir=cache_dir)
+    changed_time = time.perf_counter() - start
+    GraphCache(cache_dir).clear()
+
+    same_graph = (getEdgeWeights(cold.getGraph_of_Database()) == getEdgeWeights(warm.getGraph_of_Database())
+                  and cold.nodes_by_attribute_dict == warm.nodes_by_attribute_dict)
+    print("Graph cache on", file_name)
+    print("   cold build:          {:.3f} s".format(cold_time))
+    print("   warm load:           {:.3f} s".format(warm_time))
+    print("   new binlist rebuild: {:.3f} s".format(changed_time))
+    print("   identical graph:", same_graph)
+    return same_graph
+
+
+def writeScaledCopy(file_name, copies, scaled_file_name):
+    """ Writes the rows of file_name copies times, one copy at a time """
+    with open(file_name, encoding='utf-8-sig') as source:
+        header = source.readline()
+        body = source.read()
+    with open(scaled_file_name, 'w', encoding='utf-8') as target:
+        target.write(header)
+        for _ in range(copies):
+            target.write(body)
+
+
+def getPeakMemory(statement):
+    """ Runs statement in a fresh interpreter and returns its peak resident set size in MB.
+        The peak is the child's VmHWM: ru_maxrss of a forked child starts at the parent's peak.
+    """
+    script = (statement + "\nwith open('/proc/self/status') as status:\n"
+              "    print([line.split()[1] for line in status if line.startswith('VmHWM:')][0])")
+    output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return int(output.stdout.split()[-1]) / 1024
+
+
+def benchmarkChunkedIngest(file_name='datasets/suicide_rates_by_category.csv', copies=(1, 4, 16), chunksize=20000):
+    """ Peak RSS of the whole-file and the chunked GraphManager builds as the csv grows """
+    print("Peak memory against file size, chunksize =", chunksize)
+    scratch = tempfile.mkdtemp(prefix='chunked_ingest_')
+    for count in copies:
+        scaled_file_name = os.path.join(scratch, 'scaled_{}.csv'.format(count))
+        writeScaledCopy(file_name, count, scaled_file_name)
+        size = os.path.getsize(scaled_file_name) / 1e6
+        build = "from GraphDatabaseManager_v2 import GraphManager\nGraphManager({!r}{})"
+        whole = getPeakMemory(build.format(scaled_file_name, ''))
+        chunked = getPeakMemory(build.format(scaled_file_name, ', chunksize={}'.format(chunksize)))
+        print("   {:8.1f} MB csv: whole file {:7.1f} MB peak, chunked {:7.1f} MB peak".format(size, whole, chunked))
+        os.remove(scaled_file_name)
+    os.rmdir(scratch)
+
+
+example_schemas = [[['country', 'age', 'sex'], ['suicides_per_100k_bins']],
+                   [['country', 'sex'], ['age'], ['suicides_per_100k_bins']],
+                   [['country'], ['year'], ['suicides_per_100k_bins']],
+                   [['country', 'generation'], ['suicides_per_100k_bins']],
+                   [['age', 'sex'], ['country', 'year'], ['suicides_per_100k_bins']],
+                   [['generation', 'sex'], ['country'], ['suicides_per_100k_bins']],
+                   [['country', 'year', 'sex'], ['age', 'suicides_per_100k_bins']],
+                   [['year'], ['age'], ['sex'], ['generation'], ['suicides_per_100k_bins']]]
+
+
+def benchmarkSchemaBuilder(file_name='datasets/suicide_rates_by_category.csv', schemas=example_schemas):
+    """ One GraphManager per schema against a single parse shared by a process pool """
+    start = time.perf_counter()
+    serial = [GraphManager(file_name, node_types=schema).getGraph_of_Database() for schema in schemas]
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = SchemaBuilder(file_name).buildGraphs(schemas)
+    parallel_time = time.perf_counter() - start
+
+    same_graphs = all(getEdgeWeights(a) == getEdgeWeights(b) for a, b in zip(serial, parallel))
+    print("Building", len(schemas), "schemas on", os.cpu_count(), "cores")
+    print("   one GraphManager per schema: {:.3f} s".format(serial_time))
+    print("   SchemaBuilder:               {:.3f} s".format(parallel_time))
+    print("   identical graphs:", same_graphs)
+    return same_graphs
+
+
+def benchmarkAnalytics(file_name='datasets/suicide_rates_by_category.csv'):
+    """ networkx diameter, radius and assortativity against AnalyticsEngine on the largest component """
+    graph_database = GraphManager(file_name)
+    G = graph_database.extractLargestComponent(graph_database.getGraph_of_Database())
+
+    start = time.perf_counter()
+    expected = (nx.diameter(G), nx.radius(G), nx.degree_assortativity_coefficient(G))
+    networkx_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = AnalyticsEngine(G)
+    distance_measures = engine.getDistanceMeasures()
+    result = (distance_measures['diameter'], distance_measures['radius'], engine.getDegreeAssortativity())
+    engine_time = time.perf_counter() - start
+
+    same_results = expected[:2] == result[:2] and abs(expected[2] - result[2]) < 1e-9
+    print("Analytics on the largest component ({} nodes, {} edges)".format(G.number_of_nodes(), G.number_of_edges()))
+    print("   networkx:        {:.3f} s".format(networkx_time))
+    print("   AnalyticsEngine: {:.3f} s".format(engine_time))
+    print("   speedup:         {:.1f}x".format(networkx_time / engine_time))
+    print("   identical results:", same_results)
+    return same_results
+
+
+def benchmarkBoundedDistances(file_name='datasets/suicide_rates_by_category.csv', node_type='country, age, sex'):
+    """ Exact eccentricities against the bounded mode on the largest component of a projection """
+    graph_database = GraphManager(file_name)
+    G = graph_database.extractLargestComponent(graph_database.extractProjectionGraph(node_type))
+
+    start = time.perf_counter()
+    exact = AnalyticsEngine(G).getDistanceMeasures()
+    exact_time = time.perf_counter() - start
+    bounds = AnalyticsEngine(G).getBoundedDistanceMeasures()
+
+    same_results = bounds['diameter'] == (exact['diameter'],) * 2 and bounds['radius'] == (exact['radius'],) * 2
+    print("Distance measures on the", node_type, "projection ({} nodes)".format(G.number_of_nodes()))
+    print("   all eccentricities: {:.3f} s".format(exact_time))
+    print("   bounded:            {:.3f} s with {} BFS".format(bounds['seconds'], bounds['bfs_count']))
+    print("   identical results:", same_results)
+    return same_results
+
+
+def benchmarkLayout(file_name='datasets/suicide_rates_by_category.csv', node_type='country, age, sex'):
+    """ nx.spring_layout against LayoutEngine, cold and warm-started, on the v2 graphs """
+    graph_database = GraphManager(file_name)
+    graphs = {'largest component': graph_database.extractLargestComponent(graph_database.getGraph_of_Database()),
+              node_type + ' projection': graph_database.extractLargestComponent(
+                  graph_database.extractProjectionGraph(node_type))}
+    print("Layout")
+    for name, G in graphs.items():
+        start = time.perf_counter()
+        nx.spring_layout(G, seed=1)
+        spring_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pos = LayoutEngine().getLayout(G)
+        cold_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        LayoutEngine().getLayout(G, initial_pos=pos)
+        warm_time = time.perf_counter() - start
+        print("   {} ({} nodes, {} edges)".format(name, G.number_of_nodes(), G.number_of_edges()))
+        print("      spring_layout:          {:.3f} s".format(spring_time))
+        print("      LayoutEngine:           {:.3f} s".format(cold_time))
+        print("      LayoutEngine warm:      {:.3f} s".format(warm_time))
+
+
+def benchmarkCommunities(file_name='datasets/suicide_rates_by_category.csv', resolutions=(0.5, 1.0, 2.0),
+                         seeds=(1, 2, 3, 4), processes=4):
+    """ Serial against parallel Louvain sweeps, and a repeated sweep served from the partition cache """
+    graph_database = GraphManager(file_name)
+    G = graph_database.extractLargestComponent(graph_database.getGraph_of_Database())
+    print("Louvain sweep ({} resolutions x {} seeds, {} nodes)".format(len(resolutions), len(seeds),
+                                                                      G.number_of_nodes()))
+    timings = dict()
+    for name, workers in (('serial', 1), ('parallel', processes), ('cached', processes)):
+        if name != 'cached':
+            CommunityEngine.clearCache()
+        start = time.perf_counter()
+        results = CommunityEngine(G).sweep(resolutions, seeds, workers)
+        timings[name] = time.perf_counter() - start
+        print("   {:9s} {:.3f} s".format(name + ':', timings[name]))
+    same_partition = results[1.0]['partition'] == nx.community.louvain_communities(G, weight='weight', seed=1) \
+        if results[1.0]['seed'] == 1 else None
+    for resolution, result in results.items():
+        print("   resolution {}: {} communities, modularity {:.4f}, stability {:.3f}".format(
+            resolution, result['communities'], result['modularity'], result['stability']))
+    print("   seed 1 partition matches louvain_communities:", same_partition)
+
+
+def getNetworkxMemory(core):
+    """ Bytes allocated by the networkx export of a CompactGraph, plus its label strings """
+    tracemalloc.start()
+    G = core.toNetworkx()
+    usage = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return usage + core.getMemoryUsage() - core.getMemoryUsage(include_labels=False), G
+
+
+def benchmarkCompactGraph(file_name='datasets/suicide_rates_by_category.csv',
+                          schemas=([['country', 'age', 'sex'], ['suicides_per_100k_bins']],
+                                   [['country', 'year', 'age', 'sex'], ['suicides_per_100k_bins'], ['generation']])):
+    """ Memory of the networkx and the compact GraphManager backends on the full dataset """
+    print("Compact graph backend on", file_name)
+    for node_types in schemas:
+        start = time.perf_counter()
+        networkx_graph = GraphManager(file_name, node_types=node_types)
+        networkx_time = time.perf_counter() - start
+        start = time.perf_counter()
+        compact_graph = GraphManager(file_name, node_types=node_types, backend='compact')
+        compact_time = time.perf_counter() - start
+        core = compact_graph.core
+        networkx_memory, G = getNetworkxMemory(core)
+        compact_memory = core.getMemoryUsage()
+        print("   {} ({} nodes, {} edges)".format(node_types, core.number_of_nodes(), core.number_of_edges()))
+        print("      build networkx / compact:  {:.3f} s / {:.3f} s".format(networkx_time, compact_time))
+        print("      networkx graph:   {:10.2f} MB".format(networkx_memory / 2 ** 20))
+        print("      compact graph:    {:10.2f} MB  ({:.2f} MB without labels)".format(
+            compact_memory / 2 ** 20, core.getMemoryUsage(include_labels=False) / 2 ** 20))
+        print("      saving:           {:10.1f}x".format(networkx_memory / compact_memory))
+        print("      identical weights:", getEdgeWeights(G) == getEdgeWeights(networkx_graph.G))
+
+
+def benchmarkNodeCreation(file_name='datasets/suicide_rates_by_category.csv',
+                          schemas=([['country', 'age', 'sex'], ['suicides_per_100k_bins']],
+                                   [['country', 'year', 'age', 'sex'], ['suicides_per_100k_bins']],
+                                   [['country', 'year', 'age', 'sex', 'generation'], ['suicides_per_100k_bins'],
+                                    ['country-year', 'HDI_for_year']])):
+    """ Composite nodes from the observed combinations against the full Cartesian product """
+    print("Composite node creation on", file_name)
+    for node_types in schemas:
+        timings = dict()
+        graphs = dict()
+        for name, full_product in (('full product', True), ('observed', False)):
+            start = time.perf_counter()
+            graphs[name] = GraphManager(file_name, node_types=node_types, full_product=full_product).G
+            timings[name] = time.perf_counter() - start
+        full, observed = graphs['full product'], graphs['observed']
+        print("   {}".format(node_types))
+        for name, G in graphs.items():
+            print("      {:13s} {:9d} nodes  {:.3f} s".format(name + ':', G.number_of_nodes(), timings[name]))
+        print("      same edges:", getEdgeWeights(full) == getEdgeWeights(observed),
+              " observed = non-isolated nodes:", set(observed) == {node for node in full if full.degree(node) > 0})
+
+
+def getQueryTime(query, repeats=200):
+    """ Median seconds of one call """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        query()
+        timings += [time.perf_counter() - start]
+    return sorted(timings)[len(timings) // 2]
+
+
+def benchmarkQueries(file_name='datasets/suicide_rates_by_category.csv',
+                     node_types=[['country', 'year', 'age', 'sex'], ['suicides_per_100k_bins'], ['generation']]):
+    """ Representative dashboard queries against the QueryEngine indexes """
+    graph_database = GraphManager(file_name, node_types=node_types, backend='compact')
+    start = time.perf_counter()
+    engine = graph_database.getQueryEngine()
+    build_time = time.perf_counter() - start
+    composite_type = ', '.join(node_types[0])
+    node = engine.getTopNodes(composite_type, 1)[0][0]
+    queries = {
+        'nodes of a country and sex': lambda: engine.getNodes(composite_type, country='Albania', sex='male'),
+        'bins of a country, weight >= 10': lambda: engine.getNeighborsByValue(
+            neighbor_type='suicides_per_100k_bins', min_weight=10, country='Albania'),
+        'neighbours of a node, weight >= 2': lambda: engine.getNeighbors(node, min_weight=2),
+        'top 10 nodes by weighted degree': lambda: engine.getTopNodes(composite_type, 10),
+        'top 10 nodes in bin 75-100': lambda: engine.getTopNodes(composite_type, 10, neighbor_of='75-100'),
+        'top 10 nodes of 1990 in bin 75-100': lambda: engine.getTopNodes(composite_type, 10, neighbor_of='75-100',
+                                                                         year=1990),
+        'weighted degree of a node': lambda: engine.getWeightedDegree(node),
+    }
+    print("Queries on {} ({} nodes, {} edges), indexes built in {:.3f} s".format(
+        composite_type, engine.core.number_of_nodes(), engine.core.number_of_edges(), build_time))
+    for name, query in queries.items():
+        print("   {:38s} {:8.1f} us".format(name + ':', getQueryTime(query) * 1e6))
+
+    # The same top 10 by scanning the networkx graph
+    G = graph_database.G
+
+    def scanTopNodes():
+        candidates = [neighbor for neighbor in G['75-100']
+                      if neighbor in graph_database.nodes_by_attribute_dict[composite_type]]
+        return sorted(candidates, key=lambda neighbor: -G.degree(neighbor, weight='weight'))[:10]
+    print("   {:38s} {:8.1f} us".format('networkx scan, top 10 in bin 75-100:', getQueryTime(scanTopNodes, 20) * 1e6))
+
+
+def benchmarkTemporal(file_name='datasets/suicide_rates_by_category.csv', window=(1990, 1995)):
+    """ One temporal pass against building a networkx graph per year """
+    graph_database = GraphManager(file_name)
+    start = time.perf_counter()
+    temporal = graph_database.getTemporalGraph('year')
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    trajectories = temporal.getDegreeTrajectories(weighted=True)
+    deltas = temporal.getWeightDeltas()
+    analytics_time = time.perf_counter() - start
+    start = time.perf_counter()
+    window_graph = temporal.getWindow(*window)
+    window_time = time.perf_counter() - start
+
+    # Per-year graphs rebuilt from the filtered rows
+    dataframe = graph_database.database.dataframe
+    start = time.perf_counter()
+    yearly = dict()
+    for year in temporal.times.tolist():
+        rows = DatabaseManager.fromDataframe(dataframe[dataframe['year'] == year], categorical=False)
+        yearly[year] = GraphManager(None, database=rows).getGraph_of_Database()
+    rebuild_time = time.perf_counter() - start
+    same_snapshots = all(getEdgeWeights(temporal.getSnapshot(year).toNetworkx()) == getEdgeWeights(G)
+                         for year, G in yearly.items())
+    window_rows = DatabaseManager.fromDataframe(dataframe[dataframe['year'].between(*window)], categorical=False)
+    same_window = getEdgeWeights(window_graph.toNetworkx()) == \
+        getEdgeWeights(GraphManager(None, database=window_rows).getGraph_of_Database())
+    print("Temporal graph ({} years x {} edges, {:.2f} MB)".format(
+        len(temporal.times), deltas.shape[1], temporal.getMemoryUsage() / 2 ** 20))
+    print("   temporal pass:                  {:.3f} s".format(build_time))
+    print("   degree trajectories and deltas: {:.3f} s  ({} x {})".format(analytics_time, *trajectories.shape))
+    print("   window {}-{}:                {:.4f} s".format(window[0], window[1], window_time))
+    print("   one networkx graph per year:    {:.3f} s".format(rebuild_time))
+    print("   identical snapshots:", same_snapshots, " identical window:", same_window)
+
+
+def getTracedPeak(function):
+    """ Peak bytes traced by tracemalloc while function runs """
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def benchmarkExport(file_name='datasets/suicide_rates_by_category.csv', node_type='country, age, sex'):
+    """ Edges per second and peak memory of every export format against networkx's writers,
+        on the weighted projection (about 650k edges)
+    """
+    graph_database = GraphManager(file_name)
+    G = graph_database.extractProjectionGraph(node_type, weight='product')
+    exporter = GraphExporter()
+    with tempfile.TemporaryDirectory() as directory:
+        writers = {'nx.write_gexf': lambda: nx.write_gexf(G, os.path.join(directory, 'nx.gexf')),
+                   'nx.write_graphml': lambda: nx.write_graphml(G, os.path.join(directory, 'nx.graphml')),
+                   'GEXF stream': lambda: exporter.write(G, os.path.join(directory, 'graph.gexf')),
+                   'GraphML stream': lambda: exporter.write(G, os.path.join(directory, 'graph.graphml')),
+                   'Parquet tables': lambda: exporter.write(G, os.path.join(directory, 'graph.parquet')),
+                   'Arrow tables': lambda: exporter.write(G, os.path.join(directory, 'graph.arrow'))}
+        print("Export of {} projection ({} nodes, {} edges)".format(node_type, G.number_of_nodes(),
+                                                                   G.number_of_edges()))
+        for name, writer in writers.items():
+            try:
+                start = time.perf_counter()
+                writer()
+                seconds = time.perf_counter() - start
+            except ImportError:
+                print("   {:17s} skipped, pyarrow is not installed".format(name + ':'))
+                continue
+            peak = getTracedPeak(writer)
+            print("   {:17s} {:10.0f} edges/s  {:8.1f} MB peak".format(
+                name + ':', G.number_of_edges() / seconds, peak / 2 ** 20))
+
+
+def benchmarkDatasetGenerator(num_rows=1000000):
+    """ Generation speed of DatasetGenerator, the peak RSS of a fresh interpreter running it, and the
+        bins its rates fill
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'synthetic.csv')
+        start = time.perf_counter()
+        DatasetGenerator(num_rows).write(file_name)
+        seconds = time.perf_counter() - start
+        peak = getPeakMemory("from DatasetGenerator import DatasetGenerator\n"
+                             "DatasetGenerator({}).write({!r})".format(num_rows, file_name))
+        bins = DatabaseManager(file_name).dataframe['suicides_per_100k_bins'].value_counts(sort=False)
+    print("Synthetic dataset of", num_rows, "rows")
+    print("   {:.0f} rows/s, {:.1f} MB peak".format(num_rows / seconds, peak))
+    print("   rows per bin:", {name: int(count) for name, count in bins.items()})
+    return bool((bins > 0).all())
+
+
+def getCutRows(dataframe, binlist):
+    """ The cleaning and binning DatabaseManager did before PreprocessingPipeline: a filter and pd.cut """
+    dataframe = dataframe[~dataframe['generation'].isin(['G.I. Generation'])].copy()
+    names = [str(low) + '-' + str(high) for low, high in zip(binlist[:-1], binlist[1:])]
+    dataframe['suicides_per_100k_bins'] = pd.cut(dataframe['suicides_per_100k'], binlist, include_lowest=True,
+                                                 labels=names)
+    return dataframe
+
+
+def benchmarkPreprocessing(file_name='datasets/suicide_rates_by_category.csv', copies=20):
+    """ The filter and pd.cut path against PreprocessingPipeline on copies of the rows, and
+        DatabaseManager construction without and with the preprocessing cache
+    """
+    dataframe = DatabaseManager(file_name, pipeline=PreprocessingPipeline(), cache=False).dataframe
+    dataframe = pd.concat([dataframe] * copies, ignore_index=True)
+    pipeline = DatabaseManager.getDefaultPipeline()
+
+    start = time.perf_counter()
+    expected = getCutRows(dataframe, list(pipeline.bins['suicides_per_100k']['edges']))
+    cut_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = pipeline.apply(dataframe)
+    pipeline_time = time.perf_counter() - start
+
+    PreprocessingPipeline.clearCache()
+    start = time.perf_counter()
+    DatabaseManager(file_name)
+    cold_time = time.perf_counter() - start
+    start = time.perf_counter()
+    DatabaseManager(file_name)
+    warm_time = time.perf_counter() - start
+
+    same_rows = expected.equals(result)
+    print("Preprocessing {} rows".format(len(dataframe)))
+    print("   filter and pd.cut:           {:.3f} s".format(cut_time))
+    print("   PreprocessingPipeline:       {:.3f} s".format(pipeline_time))
+    print("   DatabaseManager cold:        {:.3f} s".format(cold_time))
+    print("   DatabaseManager cached file: {:.3f} s".format(warm_time))
+    print("   identical rows:", same_rows)
+    return same_rows
+
+
+def benchmarkFilteredViews(file_name='datasets/suicide_rates_by_category.csv', thresholds=(25, 50, 100, 150)):
+    """ Writing the rows over a rate threshold to a csv and building its graph (how the
+        suicide_rates_over_N.csv files were made) against a filtered view of one built graph
+    """
+    dataframe = pd.read_csv(file_name)
+    graph_database = GraphManager(file_name)
+    start = time.perf_counter()
+    graph_database.getRowEdgeIndex()
+    index_time = time.perf_counter() - start
+    print("Filtered views on", file_name, "(row index built in {:.3f} s)".format(index_time))
+    same_graphs = True
+    with tempfile.TemporaryDirectory() as directory:
+        for threshold in thresholds:
+            start = time.perf_counter()
+            filtered_file_name = os.path.join(directory, 'suicide_rates_over_{}.csv'.format(threshold))
+            dataframe[dataframe['suicides/100k pop'] >= threshold].to_csv(filtered_file_name, index=False)
+            rebuilt = GraphManager(filtered_file_name).getGraph_of_Database()
+            rebuild_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            view = graph_database.getFilteredGraph(min_rate=threshold)
+            view_time = time.perf_counter() - start
+            same_graphs &= getEdgeWeights(rebuilt) == getEdgeWeights(view) and set(rebuilt) == set(view)
+            print("   rate >= {:3d}: csv and rebuild {:.3f} s, view {:.4f} s ({} edges)".format(
+                threshold, rebuild_time, view_time, view.number_of_edges()))
+    print("   identical graphs:", same_graphs)
+    return same_graphs
+
+
+def benchmarkImportTime(budget=import_time_budget, modules=headless_modules):
+    """ Import time of the graph modules against a budget in seconds. Headless jobs must not load
+        matplotlib or pygraphviz, which are only imported when something is drawn (test_imports.py
+        checks the same in the test suite).
+    """
+    seconds, plotting = getImportTime(modules)
+    with_pyplot, _ = getImportTime(list(modules) + ['matplotlib.pyplot'])
+    passed = seconds <= budget and len(plotting) == 0
+    print("Import time of", ", ".join(modules) + ":")
+    print("   {:.3f} s (budget {:.3f} s), {:.3f} s with pyplot".format(seconds, budget, with_pyplot))
+    print("   plotting modules loaded:", ", ".join(plotting) if len(plotting) > 0 else "none")
+    print("   within budget:", passed)
+    return passed
+
+
+def benchmarkGraphWorker(file_name='datasets/suicide_rates_by_category.csv', jobs=5):
+    """ Jobs that each start an interpreter, import and build the graph, against the same
+        jobs sent to a warm GraphWorker
+    """
+    job = ("from GraphDatabaseManager_v2 import GraphManager\n"
+           "G = GraphManager({!r}).getGraph_of_Database()\nprint(G.number_of_edges())").format(file_name)
+    start = time.perf_counter()
+    for _ in range(jobs):
+        subprocess.run([sys.executable, '-c', job], check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    cold_time = (time.perf_counter() - start) / jobs
+
+    scratch = tempfile.mkdtemp(prefix='graph_worker_')
+    worker = GraphWorker(os.path.join(scratch, 'worker.sock'), data_dir=os.path.dirname(os.path.abspath(__file__)))
+    thread = threading.Thread(target=worker.serve)
+    thread.start()
+    client = GraphWorkerClient(worker.address)
+    start = time.perf_counter()
+    client.request('build', file_name=file_name)
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(jobs):
+        client.request('build', file_name=file_name)
+    warm_time = (time.perf_counter() - start) / jobs
+    client.request('shutdown')
+    client.close()
+    thread.join()
+    os.rmdir(scratch)
+    print("Graph build jobs on", file_name)
+    print("   new interpreter per job: {:.3f} s per job".format(cold_time))
+    print("   worker: first build {:.3f} s, then {:.4f} s per job".format(first_time, warm_time))
+    return cold_time, warm_time
+
+
+def profilePipeline(file_name, profiler, node_type='country, age, sex', export_dir=None):
+    """ Runs the Run_v2 pipeline as separate stages in profiler: csv load, clean/bin, node build,
+        edge build, largest component, projection, analytics, layout and export
+    """
+    with profiler.stage('csv load'):
+        dataframe = pd.read_csv(file_name)
+    with profiler.stage('clean/bin'):
+        database = DatabaseManager(file_name, dataframe=dataframe)
+    del dataframe
+    graph_database = GraphManager(file_name, database=database, profiler=profiler)
+    G = graph_database.getGraph_of_Database()
+    with profiler.stage('largest component'):
+        largest_component = graph_database.extractLargestComponent(G)
+    with profiler.stage('projection'):
+        projection = graph_database.extractProjectionGraph(node_type)
+    with profiler.stage('analytics'):
+        engine = AnalyticsEngine(largest_component)
+        engine.getDegreeAssortativity()
+        engine.getBoundedDistanceMeasures()
+        CommunityEngine(largest_component).getPartition()
+    with profiler.stage('layout'):
+        LayoutEngine().getLayout(largest_component)
+    with tempfile.TemporaryDirectory() as directory:
+        with profiler.stage('export'):
+            graph_database.export(os.path.join(export_dir or directory, 'graph.gexf'))
+    profiler.info.update({'file': file_name, 'rows': len(database.dataframe), 'nodes': G.number_of_nodes(),
+                          'edges': G.number_of_edges(), 'projection_edges': projection.number_of_edges()})
+    return profiler
+
+
+def getScaledGenerator(file_name, scale, seed=1):
+    """ A DatasetGenerator for scale times the rows of file_name, over its number of countries and years """
+    dataframe = pd.read_csv(file_name, usecols=['country', 'year'])
+    return DatasetGenerator(scale * len(dataframe), dataframe['country'].nunique(),
+                            (int(dataframe['year'].min()), int(dataframe['year'].max())), seed)
+
+
+def runPipelineBenchmark(arguments):
+    """ Profiles the pipeline on file_name, and on synthetic data with --scales times its rows """
+    results = []
+    scratch = tempfile.mkdtemp(prefix='pipeline_')
+    for scale in arguments.scales:
+        file_name = arguments.file_name
+        if scale > 1:
+            file_name = os.path.join(scratch, 'synthetic_{}.csv'.format(scale))
+            getScaledGenerator(arguments.file_name, scale, arguments.seed).write(file_name)
+        profile_dir = None
+        if arguments.profile_dir is not None:
+            profile_dir = os.path.join(arguments.profile_dir, 'scale_{}'.format(scale))
+        profiler = PipelineProfiler(trace_memory=not arguments.no_trace_memory, profile_dir=profile_dir)
+        profiler.info['scale'] = scale
+        print("Pipeline at scale {} ({})".format(scale, file_name))
+        profilePipeline(file_name, profiler, arguments.node_type)
+        results.append(profiler.getResults())
+        if arguments.compare is not None:
+            profiler.compare(arguments.compare)
+        if scale > 1:
+            os.remove(file_name)
+    os.rmdir(scratch)
+    if arguments.output is not None:
+        with open(arguments.output, 'w', encoding='utf-8') as output:
+            json.dump(results if len(results) > 1 else results[0], output, indent=2)
+        print("wrote", arguments.output)
+    return results
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(description='Timing comparisons and pipeline profiles of the graph code')
+    commands = parser.add_subparsers(dest='command')
+    pipeline = commands.add_parser('pipeline', help='time every stage of the Run_v2 pipeline')
+    pipeline.add_argument('--file-name', default='datasets/suicide_rates_by_category.csv')
+    pipeline.add_argument('--node-type', default='country, age, sex', help='projection node type')
+    pipeline.add_argument('--scales', type=int, nargs='+', default=[1],
+                          help='1 for the csv, n > 1 for synthetic data with n times its rows, e.g. 1 10 100')
+    pipeline.add_argument('--seed', type=int, default=1, help='seed of the synthetic data')
+    pipeline.add_argument('--output', help='JSON file for the results')
+    pipeline.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    pipeline.add_argument('--profile-dir', help='directory for a cProfile dump of every stage')
+    pipeline.add_argument('--no-trace-memory', action='store_true',
+                          help='skip tracemalloc, which slows pure Python stages down')
+    imports = commands.add_parser('imports', help='check the import time of the graph modules against a budget')
+    imports.add_argument('--budget', type=float, default=import_time_budget, help='seconds')
+    return parser
+
+
+def main():
+    arguments = getArgumentParser().parse_args()
+    if arguments.command == 'pipeline':
+        runPipelineBenchmark(arguments)
+        return
+    if arguments.command == 'imports':
+        sys.exit(0 if benchmarkImportTime(arguments.budget) else 1)
+    benchmarkEdgeConstruction()
+    benchmarkProjection()
+    benchmarkProjectionPruning()
+    benchmarkCategoricalLoad()
+    benchmarkGraphCache()
+    benchmarkChunkedIngest()
+    benchmarkSchemaBuilder()
+    benchmarkAnalytics()
+    benchmarkBoundedDistances()
+    benchmarkLayout()
+    benchmarkCommunities()
+    benchmarkCompactGraph()
+    benchmarkNodeCreation()
+    benchmarkQueries()
+    benchmarkTemporal()
+    benchmarkExport()
+    benchmarkDatasetGenerator()
+    benchmarkPreprocessing()
+    benchmarkFilteredViews()
+    benchmarkImportTime()
+    benchmarkGraphWorker()
+
+
+if __name__ == '__main__':
+    main()
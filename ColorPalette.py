@@ -0,0 +1,35 @@
+""" Colors for node types and communities.
+    The first seven colors are the matplotlib letters the plots have always
+    used ('y', 'm', 'g', 'c', 'b', 'r', 'k'). Further labels get distinct hex
+    colors spaced around the hue circle by the golden angle, so any number of
+    node types or communities can be colored.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import colorsys
+
+import numpy as np
+
+base_colors = ['y', 'm', 'g', 'c', 'b', 'r', 'k']
+# Color of a node without a label (label -1)
+unlabelled_color = 'y'
+
+
+def getPalette(count):
+    palette = base_colors[:count]
+    for i in range(len(palette), count):
+        hue = (i * 0.618033988749895) % 1.0
+        red, green, blue = colorsys.hsv_to_rgb(hue, 0.65, 0.9)
+        palette.append('#{:02x}{:02x}{:02x}'.format(int(red * 255), int(green * 255), int(blue * 255)))
+    return palette
+
+
+def getColors(labels):
+    """ One color per integer label; -1 means unlabelled """
+    labels = np.asarray(labels, dtype=np.int64)
+    count = int(labels.max()) + 1 if len(labels) > 0 else 0
+    palette = np.array(getPalette(count) + [unlabelled_color], dtype=object)
+    return palette[labels].tolist()  # -1 picks the unlabelled color at the end
@@ -0,0 +1,140 @@
+""" Louvain community detection over several resolutions and seeds.
+    Every (resolution, seed) run is independent, so the runs are spread over
+    worker processes. Partitions are cached by graph fingerprint (nodes, edges
+    and weights) and run parameters, so re-plotting or re-analysing the same
+    component never runs Louvain again. The cache keeps the cache_size most
+    recently used partitions as frozensets, and callers get copies.
+
+    For each resolution the engine reports the modularity of every seed, the
+    best partition, and how stable the partition is across seeds (the mean
+    pairwise adjusted Rand index: 1 when every seed finds the same
+    communities, about 0 when they agree no more than chance).
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+
+import networkx as nx
+import numpy as np
+
+from GraphCache import GraphCache
+
+# (graph fingerprint, weight, resolution, seed) -> partition, shared by every engine in the process,
+# least recently used first
+_partition_cache = OrderedDict()
+cache_size = 64
+
+
+class CommunityEngine:
+    def __init__(self, G, weight='weight'):
+        self.G = G
+        self.weight = weight
+        self.fingerprint = GraphCache.getGraphFingerprint(G, weight)
+
+    ##################
+    # Public Methods #
+    ##################
+    def getPartition(self, resolution=1.0, seed=1):
+        """ Louvain partition (a list of node sets), computed once per graph and parameters """
+        return self.getPartitions([resolution], [seed])[(resolution, seed)]
+
+    def getPartitions(self, resolutions, seeds, processes=1):
+        """ Dictionary from (resolution, seed) to partition. Uncached runs go to a process pool """
+        runs = list(itertools.product(resolutions, seeds))
+        partitions = {run: self.__getCached(run) for run in runs}
+        missing = [run for run in runs if partitions[run] is None]
+        if processes > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                computed = list(pool.map(_louvain, [self.G] * len(missing), [self.weight] * len(missing),
+                                         *zip(*missing)))
+        else:
+            computed = [_louvain(self.G, self.weight, resolution, seed) for resolution, seed in missing]
+        for run, partition in zip(missing, computed):
+            _partition_cache[self.__getKey(*run)] = tuple(frozenset(community) for community in partition)
+            partitions[run] = [set(community) for community in partition]
+        while len(_partition_cache) > cache_size:
+            _partition_cache.popitem(last=False)
+        return partitions
+
+    def sweep(self, resolutions=(1.0,), seeds=(1,), processes=1):
+        """ For every resolution: the best partition, its seed, the modularity of every seed,
+            and the stability of the partition across seeds.
+        """
+        partitions = self.getPartitions(resolutions, seeds, processes)
+        nodelist = list(self.G.nodes())
+        results = dict()
+        for resolution in resolutions:
+            modularity = {seed: nx.community.modularity(self.G, partitions[(resolution, seed)],
+                                                        weight=self.weight, resolution=resolution)
+                          for seed in seeds}
+            best_seed = max(seeds, key=lambda seed: modularity[seed])
+            labels = [self.getLabels(partitions[(resolution, seed)], nodelist) for seed in seeds]
+            agreement = [getAdjustedRandIndex(a, b) for a, b in itertools.combinations(labels, 2)]
+            results[resolution] = {'partition': partitions[(resolution, best_seed)],
+                                   'seed': best_seed,
+                                   'communities': len(partitions[(resolution, best_seed)]),
+                                   'modularity': modularity[best_seed],
+                                   'mean_modularity': float(np.mean(list(modularity.values()))),
+                                   'seed_modularity': modularity,
+                                   'stability': float(np.mean(agreement)) if len(agreement) > 0 else 1.0}
+        return results
+
+    @staticmethod
+    def getLabels(partition, nodelist):
+        """ Index of the community of every node in nodelist (-1 if in none) """
+        community_index = dict()
+        for i, community in enumerate(partition):
+            for node in community:
+                community_index.setdefault(node, i)
+        return np.array([community_index.get(node, -1) for node in nodelist], dtype=np.int64)
+
+    @staticmethod
+    def clearCache():
+        _partition_cache.clear()
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getKey(self, resolution, seed):
+        return (self.fingerprint, self.weight, resolution, seed)
+
+    def __getCached(self, run):
+        """ A copy of the cached partition of run, or None """
+        key = self.__getKey(*run)
+        if key not in _partition_cache:
+            return None
+        _partition_cache.move_to_end(key)
+        return [set(community) for community in _partition_cache[key]]
+
+
+def getAdjustedRandIndex(labels_a, labels_b):
+    """ Adjusted Rand index of two labelings of the same nodes, from their contingency table """
+    labels_a = np.unique(labels_a, return_inverse=True)[1]
+    labels_b = np.unique(labels_b, return_inverse=True)[1]
+    num_nodes = len(labels_a)
+    if num_nodes < 2:
+        return 1.0
+    contingency = np.bincount(labels_a * (labels_b.max() + 1) + labels_b)
+
+    def pairs(counts):
+        counts = counts.astype(np.float64)
+        return (counts * (counts - 1) / 2).sum()
+
+    index = pairs(contingency)
+    pairs_a = pairs(np.bincount(labels_a))
+    pairs_b = pairs(np.bincount(labels_b))
+    expected = pairs_a * pairs_b / (num_nodes * (num_nodes - 1) / 2)
+    maximum = (pairs_a + pairs_b) / 2
+    if maximum == expected:
+        # Both labelings put every node alone, or every node together
+        return 1.0
+    return float((index - expected) / (maximum - expected))
+
+
+def _louvain(G, weight, resolution, seed):
+    return nx.community.louvain_communities(G, weight=weight, resolution=resolution, seed=seed)
@@ -0,0 +1,152 @@
+""" Compact, integer-indexed graph storage.
+    Nodes are integer ids with a separate label table (the composite node
+    strings), and the weighted adjacency is held in CSR arrays: indptr,
+    indices (int32 node ids) and a float64 weight array. An undirected edge is
+    stored in both rows, so the neighbours of a node are one slice.
+
+    Compared with networkx, which keeps a dictionary per node and an attribute
+    dictionary per edge, this needs a few bytes per edge. toNetworkx builds the
+    equivalent networkx graph for callers that need one.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import sys
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+class CompactGraph:
+    def __init__(self, directed=False, labels=None, adjacency=None):
+        """ labels is the label of every node id, adjacency the CSR matrix of edge weights between ids """
+        self.directed = directed
+        self.labels = np.array([] if labels is None else labels, dtype=object)
+        if adjacency is None:
+            adjacency = sparse.csr_matrix((len(self.labels), len(self.labels)), dtype=np.float64)
+        adjacency = sparse.csr_matrix(adjacency, dtype=np.float64)
+        self.indptr = adjacency.indptr
+        self.indices = adjacency.indices.astype(np.int32, copy=False)
+        self.weights = adjacency.data
+        self.__index = None
+
+    @staticmethod
+    def fromNetworkx(G, weight='weight'):
+        labels = list(G.nodes())
+        return CompactGraph(G.is_directed(), labels,
+                            nx.to_scipy_sparse_array(G, nodelist=labels, weight=weight, dtype=np.float64,
+                                                     format='csr'))
+
+    ##################
+    # Public Methods #
+    ##################
+    def is_directed(self):
+        return self.directed
+
+    def nodes(self):
+        return self.labels.tolist()
+
+    def number_of_nodes(self):
+        return len(self.labels)
+
+    def number_of_edges(self):
+        if self.directed:
+            return len(self.indices)
+        # Every undirected edge is stored twice, except self loops
+        return (len(self.indices) + int(np.count_nonzero(self.getAdjacency().diagonal()))) // 2
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.__getIndex()
+
+    def getIds(self, labels):
+        """ Node id of every label (-1 for labels not in the graph) """
+        return self.__getIndex().get_indexer(pd.Index(labels, dtype=object))
+
+    def getNeighbors(self, label):
+        """ Returns the labels of the (out-)neighbours of a node and the weights of the edges to them """
+        node_id = self.getIds([label])[0]
+        if node_id < 0: raise KeyError(label)
+        start, end = self.indptr[node_id], self.indptr[node_id + 1]
+        return self.labels[self.indices[start:end]].tolist(), self.weights[start:end]
+
+    def getWeight(self, u, v, default=0.0):
+        u_id, v_id = self.getIds([u, v])
+        if u_id < 0 or v_id < 0:
+            return default
+        start, end = self.indptr[u_id], self.indptr[u_id + 1]
+        matches = np.flatnonzero(self.indices[start:end] == v_id)
+        return float(self.weights[start + matches[0]]) if len(matches) > 0 else default
+
+    def getDegrees(self, weighted=False):
+        """ (Out-)degree of every node id, or the sum of its edge weights """
+        if weighted:
+            return np.asarray(self.getAdjacency().sum(axis=1)).ravel()
+        return np.diff(self.indptr)
+
+    def getAdjacency(self, weighted=True):
+        """ The adjacency as a scipy CSR matrix sharing this graph's arrays """
+        data = self.weights if weighted else np.ones_like(self.weights)
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(len(self.labels), len(self.labels)))
+
+    def getEdgeArrays(self):
+        """ Returns (sources, targets, weights) with every edge once """
+        A = self.getAdjacency().tocoo()
+        if not self.directed:
+            A = sparse.triu(A).tocoo()
+        return A.row.astype(np.int32), A.col.astype(np.int32), A.data
+
+    def addNodes(self, labels):
+        """ Returns a graph with the labels that are not yet nodes added as isolated nodes """
+        labels = pd.unique(pd.Series(list(labels), dtype=object))
+        labels = labels[self.getIds(labels) < 0]
+        if len(labels) == 0:
+            return self
+        num_nodes = len(self.labels) + len(labels)
+        A = self.getAdjacency()
+        A.resize((num_nodes, num_nodes))
+        return CompactGraph(self.directed, np.concatenate([self.labels, labels]), A)
+
+    def addEdges(self, sources, targets, weights):
+        """ Returns a graph with the weights added to the edges between the labels, creating edges as needed """
+        graph = self.addNodes(np.concatenate([np.asarray(sources, dtype=object), np.asarray(targets, dtype=object)]))
+        rows = graph.getIds(sources)
+        cols = graph.getIds(targets)
+        weights = np.asarray(weights, dtype=np.float64)
+        shape = (len(graph.labels), len(graph.labels))
+        update = sparse.coo_matrix((weights, (rows, cols)), shape=shape).tocsr()
+        if not graph.directed:
+            update = update + update.T - sparse.diags(update.diagonal())
+        return CompactGraph(graph.directed, graph.labels, graph.getAdjacency() + update)
+
+    def toNetworkx(self):
+        """ The equivalent networkx graph. Integral weights are exported as ints like in the networkx backend """
+        G = nx.empty_graph(create_using=nx.DiGraph if self.directed else nx.Graph)
+        G.add_nodes_from(self.labels.tolist())
+        sources, targets, weights = self.getEdgeArrays()
+        if np.array_equal(weights, np.round(weights)):
+            weights = weights.astype(np.int64)
+        labels = self.labels
+        G.add_weighted_edges_from(zip(labels[sources].tolist(), labels[targets].tolist(), weights.tolist()))
+        return G
+
+    def getMemoryUsage(self, include_labels=True):
+        """ Bytes held by the arrays, and by the label strings if include_labels """
+        usage = self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes + self.labels.nbytes
+        if include_labels:
+            usage += sum(sys.getsizeof(label) for label in self.labels.tolist())
+        return usage
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getIndex(self):
+        if self.__index is None:
+            self.__index = pd.Index(self.labels, dtype=object)
+        return self.__index
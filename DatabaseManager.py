@@ -14,16 +14,74 @@
 import pandas as pd
 import numpy as np
 
+from PreprocessingPipeline import PreprocessingPipeline
+
+# Some data relabelling from https://www.kaggle.com/code/chingchunyeh/suicide-rates-overview-1985-to-2016
+column_names = {"suicides/100k pop":"suicides_per_100k","HDI for year":"HDI_for_year",
+                " gdp_for_year ($) ":"gdp_for_year"," gdp_per_capita ($) ":"gdp_per_capita",
+                "gdp_per_capita ($)":"gdp_per_capita","gdp_for_year ($)":"gdp_for_year"}
+# Columns that hold a comma separated list of values rather than a single value
+multi_valued_categories = {'genre','writers','directors','casts'}
+# Column types used by the categorical load path (after relabelling)
+column_dtypes = {"country":"category","year":np.int16,"sex":"category","age":"category",
+                 "suicides_no":np.int32,"population":np.int64,"suicides_per_100k":np.float64,
+                 "country-year":"category","HDI_for_year":np.float64,"gdp_for_year":np.int64,
+                 "gdp_per_capita":np.int64,"generation":"category"}
+# Rows dropped by cleanDatabase, as column -> values to exclude
+# The G.I. Generation doesn't have age categories for all groups
+# I don't know why but it feels like we should drop that so that
+# all generations have all age groups
+excluded_values = {'generation':['G.I. Generation']}
+# A tuple so that no caller can change the default in place
+default_binlist = (0,25,75,100,125,150,300)
+
 class DatabaseManager:
-    def __init__(self,file_name):
-        self.dataframe = pd.read_csv(file_name)
-        # Some data relabelling from https://www.kaggle.com/code/chingchunyeh/suicide-rates-overview-1985-to-2016
-        self.dataframe.rename(columns={"suicides/100k pop":"suicides_per_100k","HDI for year":"HDI_for_year",
-                  " gdp_for_year ($) ":"gdp_for_year"," gdp_per_capita ($) ":"gdp_per_capita",
-                    "gdp_per_capita ($)":"gdp_per_capita"}, inplace=True)
-        self.dataframe["gdp_for_year"] = self.dataframe["gdp_for_year"].str.replace(",","").astype(np.int64) 
-        self.cleanDatabase()
-        self.binCategory('suicides_per_100k',binlist = [0,25,75,100,125,150,300])
+    def __init__(self,file_name,categorical = False,binlist = default_binlist,dataframe = None,pipeline = None,
+                 cache = True):
+        """ categorical=True reads the string columns as pandas Categoricals with explicit dtypes
+            for the numeric columns, so that getCategoryCodes can hand integer codes to the graph builders.
+            binlist is used to bin suicides_per_100k.
+            dataframe, if given, holds raw csv rows that are used instead of reading file_name (see readChunks).
+            pipeline, a PreprocessingPipeline, replaces the default cleaning and binning (see getDefaultPipeline).
+            Its fitted version (quantile bins turned into fixed edges) is kept in self.pipeline.
+            With cache, the preprocessed rows of a file are reused when the same file is preprocessed again.
+        """
+        self.categorical = categorical
+        if pipeline is None: pipeline = self.getDefaultPipeline(binlist)
+        rows_key = None
+        cached = None
+        if dataframe is None and cache:
+            # A file that was already preprocessed the same way is neither read nor preprocessed again
+            rows_key = (self.__getFileHash(file_name),categorical)
+            cached = pipeline.getCached(rows_key)
+        if cached is None:
+            if dataframe is None:
+                dataframe = pd.read_csv(file_name,**self.__getReadOptions(file_name,categorical))
+            cached = pipeline.run(self.__parseColumns(dataframe,categorical),rows_key)
+        self.pipeline, self.dataframe = cached
+    @staticmethod
+    def fromDataframe(dataframe,categorical = True):
+        """ Wraps rows that are already relabelled, cleaned and binned, without reading a file """
+        database = DatabaseManager.__new__(DatabaseManager)
+        database.categorical = categorical
+        database.dataframe = dataframe
+        database.pipeline = None
+        return database
+    @staticmethod
+    def readChunks(file_name,chunksize,categorical = False,binlist = default_binlist,pipeline = None):
+        """ Yields one cleaned and binned DatabaseManager per chunk of chunksize rows.
+            The whole file is never held in memory at once, so quantile bins are not supported.
+        """
+        if pipeline is not None and not pipeline.isFixed(): raise ValueError
+        options = DatabaseManager.__getReadOptions(file_name,categorical)
+        for chunk in pd.read_csv(file_name,chunksize=chunksize,**options):
+            yield DatabaseManager(file_name,categorical,binlist,dataframe=chunk,pipeline=pipeline)
+    @staticmethod
+    def getDefaultPipeline(binlist = default_binlist):
+        """ The excluded_values filters followed by the binlist bins of suicides_per_100k """
+        return PreprocessingPipeline(filters=[{'column':category,'exclude':values}
+                                              for category, values in excluded_values.items()],
+                                     bins={'suicides_per_100k':{'edges':list(binlist)}})
     ###############################
     # Public Extraction Utilities #
     ###############################
@@ -31,20 +89,14 @@ class DatabaseManager:
         self.showHead()
         self.showInfo()
     def cleanDatabase(self):
-        """ A subjective set of operations to eliminate certain types of rows """
-        # The G.I. Generation doesn't have age categories for all groups
-        # I don't know why but it feels like we should drop that so that
-        # all generations have all age groups
-        self.dataframe = self.dataframe[self.dataframe['generation'] != 'G.I. Generation']
-    def binCategory(self,category, binlist = [0,25,75,100,125,150,300]):
+        """ A subjective set of operations to eliminate certain types of rows (see excluded_values) """
+        filters = [{'column':category,'exclude':values} for category, values in excluded_values.items()]
+        self.dataframe = PreprocessingPipeline(filters=filters).apply(self.dataframe)
+    def binCategory(self,category, binlist = default_binlist):
         if category not in set(self.dataframe.columns): raise ValueError
         else:
-            names = []
-            for i in range(len(binlist)-1):
-                binname = str(binlist[i]) + '-' + str(binlist[i+1])
-                names.append(binname)
             new_category = category + "_bins"
-            self.dataframe[new_category] = pd.cut(self.dataframe[category],binlist,include_lowest=True,labels = names)
+            self.dataframe[new_category] = PreprocessingPipeline.binValues(self.dataframe[category],binlist)
     def showValuesOfType(self,category):
         if category not in set(self.dataframe.columns): raise ValueError
         else:
@@ -60,30 +112,71 @@ class DatabaseManager:
         ### Returns a dictionary indexed by node_type with corresponding label 
         if category not in set(self.dataframe.columns): raise ValueError
         
-        node_set = set()
-        entries = self.dataframe[category].unique() # No need to add it again if not unique
-        for i in range(len(entries)):
-            iterator = self.__getCategoryIterator(category,entries[i])
-            for entry in iterator:
-                node_set.add(entry)
-        return node_set
+        entries = self.dataframe[category].drop_duplicates() # No need to add it again if not unique
+        if category in multi_valued_categories:
+            entries = entries.str.split(',').explode().drop_duplicates()
+        return set(entries)
     def getEdges(self,category_1, category_2):
         """ A pairwise relationship is identified by an edge """
         ### Step 1: Error check
         if category_1 not in set(self.dataframe.columns) or category_2 not in set(self.dataframe.columns): raise ValueError
         if category_1 == category_2: raise ValueError
         
-        ### Step 2: Identify pairwise relationships
-        entries_1 = list(self.dataframe[category_1])
-        entries_2 = list(self.dataframe[category_2])
-        set_of_edges = set()
-        for i in range(len(entries_1)):
-            iterator_1 = self.__getCategoryIterator(category_1,entries_1[i])
-            iterator_2 = self.__getCategoryIterator(category_2,entries_2[i])
-            for e1 in iterator_1:
-                for e2 in iterator_2:
-                    set_of_edges.add((str(e1),str(e2)))
+        ### Step 2: Identify pairwise relationships on the unique pairs only
+        pairs = self.dataframe[[category_1,category_2]].drop_duplicates()
+        for category in (category_1,category_2):
+            if category in multi_valued_categories:
+                pairs[category] = pairs[category].str.split(',')
+                pairs = pairs.explode(category).drop_duplicates()
+        set_of_edges = set(zip(pairs[category_1].map(str),pairs[category_2].map(str)))
         return set_of_edges
+    def getCategoryCodes(self,category,dataframe = None):
+        """ Integer code of every row plus the list of labels the codes index into.
+            dataframe defaults to the managed dataframe.
+        """
+        if dataframe is None: dataframe = self.dataframe
+        if category not in set(dataframe.columns): raise ValueError
+        column = dataframe[category]
+        if not isinstance(column.dtype,pd.CategoricalDtype):
+            column = column.astype('category')
+        codes = column.cat.codes.to_numpy().astype(np.int64)
+        labels = [str(label) for label in column.cat.categories]
+        if (codes < 0).any(): # missing values get their own 'nan' label, like str(nan)
+            codes[codes < 0] = len(labels)
+            labels.append('nan')
+        return codes, labels
+    def getCompositeCodes(self,categories,dataframe = None):
+        """ Integer code of every row for the composite key built from several categories.
+            labels[code] is the same ', ' joined string the graph managers use as a node name.
+        """
+        if dataframe is None: dataframe = self.dataframe
+        for category in categories:
+            if category not in set(dataframe.columns): raise ValueError
+        if len(categories) == 1:
+            return self.getCategoryCodes(categories[0],dataframe)
+        codes = dataframe.groupby(list(categories),observed=True,sort=False,dropna=False).ngroup().to_numpy()
+        first_rows = np.unique(codes,return_index=True)[1]
+        unique_rows = dataframe[list(categories)].iloc[first_rows]
+        return codes, self.__joinLabels(unique_rows,categories)
+    def getCompositeNodes(self,categories):
+        """ The composite node names of the combinations of categories that occur in the rows """
+        for category in categories:
+            if category not in set(self.dataframe.columns): raise ValueError
+        unique_rows = self.dataframe[list(categories)].drop_duplicates()
+        return set(self.__joinLabels(unique_rows,categories))
+    def getMemoryUsage(self):
+        """ Bytes used by the dataframe, including the Python string objects """
+        return self.dataframe.memory_usage(deep=True).sum()
+
+    @staticmethod
+    def __joinLabels(unique_rows,categories):
+        """ The ', ' joined str() of the categories in every row """
+        columns = []
+        for category in categories:
+            # str() each distinct value once; missing values become 'nan'
+            codes,values = pd.factorize(unique_rows[category].astype(object),use_na_sentinel=False)
+            columns += [np.array([str(value) for value in values],dtype=object)[codes].tolist()]
+        return [', '.join(values) for values in zip(*columns)]
 
     ##############################
     # Private Overview Utilities #
@@ -102,9 +195,25 @@ class DatabaseManager:
     ################################
     # Private Extraction Utilities #
     ################################
-    def __getCategoryIterator(self,category,value):
-        if category in {'genre','writers','directors','casts'}:
-            my_iterator = set(value.split(','))
-        else:
-            my_iterator = {value,} # Notice the trailing comma. Necessary to allow iteration
-        return my_iterator
\ No newline at end of file
+    @staticmethod
+    def __getFileHash(file_name):
+        # Imported here because GraphCache imports this module
+        from GraphCache import GraphCache
+        return GraphCache.getFileHash(file_name)
+    @staticmethod
+    def __getReadOptions(file_name,categorical):
+        if not categorical: return dict()
+        # Read the header first so the dtypes can be given by their relabelled names
+        header = pd.read_csv(file_name,nrows=0).columns
+        dtypes = dict()
+        for raw_name in header:
+            name = column_names.get(raw_name,raw_name)
+            if name in column_dtypes: dtypes[raw_name] = column_dtypes[name]
+        # thousands=',' parses "2,156,624,900" directly, so no string replace is needed
+        return {'dtype':dtypes,'thousands':','}
+    @staticmethod
+    def __parseColumns(dataframe,categorical):
+        dataframe = dataframe.rename(columns=column_names)
+        if not categorical:
+            dataframe["gdp_for_year"] = dataframe["gdp_for_year"].str.replace(",","").astype(np.int64) 
+        return dataframe
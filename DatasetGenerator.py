@@ -0,0 +1,150 @@
+""" Synthetic suicide rate datasets for scale testing the graph builders.
+    Writes csv files with the header and formatting of
+    datasets/suicide_rates_by_category.csv (quoted, comma separated
+    " gdp_for_year ($) ", generations derived from the birth year, an HDI
+    column that is mostly empty), so DatabaseManager reads them unchanged.
+
+    Like the real data, every country-year is a block of 12 rows (2 sexes x
+    6 age groups). Rates are log-normal around the median of the age and sex
+    group, scaled by a per-country factor, which gives the long tail of the
+    real data and fills every bin of the default binlist. When there are more
+    blocks than country-years, the country-years repeat with new draws.
+
+    Rows are generated and appended block_batch blocks at a time with numpy,
+    so files of 10M+ rows never have to fit in memory. The same seed and
+    parameters always give the same file.
+
+    python DatasetGenerator.py 10000000 datasets/synthetic_10M.csv --countries 200
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+header = ['country', 'year', 'sex', 'age', 'suicides_no', 'population', 'suicides/100k pop', 'country-year',
+          'HDI for year', ' gdp_for_year ($) ', 'gdp_per_capita ($)', 'generation']
+sexes = ['male', 'female']
+ages = ['5-14 years', '15-24 years', '25-34 years', '35-54 years', '55-74 years', '75+ years']
+# Middle of every age group, used to derive the birth year and so the generation
+age_middles = np.array([10, 20, 30, 45, 65, 80])
+# Share of the population in every age group
+age_shares = np.array([0.15, 0.16, 0.16, 0.28, 0.18, 0.07])
+# Median suicides/100k pop of every sex (rows) and age group (columns) in the real data
+median_rates = np.array([[0.46, 11.39, 16.45, 20.16, 20.61, 28.32],
+                         [0.23, 3.40, 3.81, 4.91, 5.48, 5.37]])
+# First birth year of every generation, in order
+generations = [(-np.inf, 'G.I. Generation'), (1925, 'Silent'), (1946, 'Boomers'), (1965, 'Generation X'),
+               (1981, 'Millenials'), (1997, 'Generation Z')]
+rows_per_block = len(sexes) * len(ages)
+
+
+class DatasetGenerator:
+    def __init__(self, num_rows, num_countries=100, years=(1985, 2016), seed=1, block_batch=1 << 14):
+        """ num_rows is rounded up to whole country-year blocks of 12 rows. years is inclusive. """
+        if num_rows < 1 or num_countries < 1 or years[1] < years[0]: raise ValueError
+        self.num_rows = num_rows
+        self.num_countries = num_countries
+        self.years = np.arange(years[0], years[1] + 1)
+        self.seed = seed
+        self.block_batch = block_batch
+        self.num_blocks = -(-num_rows // rows_per_block)
+        # Country level parameters: name, rate factor, population and gdp per capita
+        rng = np.random.default_rng([seed, 0])
+        self.countries = np.array(['Country {:05d}'.format(i + 1) for i in range(num_countries)], dtype=object)
+        self.rate_factors = rng.lognormal(0.0, 0.75, num_countries)
+        self.populations = rng.lognormal(np.log(5e6), 1.6, num_countries)
+        self.gdp_per_capita = rng.lognormal(np.log(8000), 1.1, num_countries)
+        self.hdi = rng.uniform(0.45, 0.95, num_countries)
+
+    ##################
+    # Public Methods #
+    ##################
+    def write(self, file_name):
+        """ Streams the rows to file_name one batch of blocks at a time. Returns the number of rows written """
+        num_rows = 0
+        with open(file_name, 'w', encoding='utf-8', newline='') as output:
+            output.write(','.join(header) + '\n')
+            for batch, start in enumerate(range(0, self.num_blocks, self.block_batch)):
+                frame = self.getBatch(batch, start, min(start + self.block_batch, self.num_blocks))
+                frame.to_csv(output, header=False, index=False)
+                num_rows += len(frame)
+        return num_rows
+
+    def getBatch(self, batch, start, end):
+        """ The rows of the blocks start to end (exclusive), drawn from the random stream of batch """
+        rng = np.random.default_rng([self.seed, 1, batch])
+        blocks = np.arange(start, end)
+        # Blocks run through the years of a country, then through the countries, then repeat
+        countries = (blocks // len(self.years)) % self.num_countries
+        years = self.years[blocks % len(self.years)]
+        num_blocks = len(blocks)
+
+        block_growth = rng.lognormal(0.0, 0.05, num_blocks) * 1.015 ** (years - self.years[0])
+        block_population = self.populations[countries] * block_growth
+        gdp_per_capita = np.round(self.gdp_per_capita[countries] * block_growth).astype(np.int64)
+        gdp = gdp_per_capita * np.round(block_population).astype(np.int64)
+        hdi = np.where(rng.random(num_blocks) < 0.3, np.round(self.hdi[countries], 3), np.nan)
+
+        # One row per block, sex and age group
+        row_blocks = np.repeat(np.arange(num_blocks), rows_per_block)
+        sex_codes = np.tile(np.repeat(np.arange(len(sexes)), len(ages)), num_blocks)
+        age_codes = np.tile(np.arange(len(ages)), len(sexes) * num_blocks)
+        row_countries = countries[row_blocks]
+        row_years = years[row_blocks]
+        num_rows = len(row_blocks)
+
+        population = np.maximum(np.round(block_population[row_blocks] * age_shares[age_codes] / 2 *
+                                         rng.lognormal(0.0, 0.1, num_rows)), 1).astype(np.int64)
+        rates = median_rates[sex_codes, age_codes] * self.rate_factors[row_countries] * \
+            rng.lognormal(0.0, 0.45, num_rows)
+        # Rates are reported from the whole number of suicides, as in the real data
+        suicides = np.round(np.minimum(rates, 290.0) * population / 1e5).astype(np.int64)
+        rates = np.round(suicides / population * 1e5, 2)
+
+        country_names = self.countries[row_countries]
+        year_labels = row_years.astype(str).astype(object)
+        return pd.DataFrame({
+            'country': country_names,
+            'year': row_years,
+            'sex': np.array(sexes, dtype=object)[sex_codes],
+            'age': np.array(ages, dtype=object)[age_codes],
+            'suicides_no': suicides,
+            'population': population,
+            'suicides/100k pop': rates,
+            'country-year': country_names + year_labels,
+            'HDI for year': hdi[row_blocks],
+            # Thousands separators are only formatted once per block
+            ' gdp_for_year ($) ': np.array(['{:,}'.format(value) for value in gdp.tolist()], dtype=object)[row_blocks],
+            'gdp_per_capita ($)': gdp_per_capita[row_blocks],
+            'generation': self.__getGenerations(row_years - age_middles[age_codes]),
+        })
+
+    ###################
+    # Private Methods #
+    ###################
+    @staticmethod
+    def __getGenerations(birth_years):
+        starts = np.array([start for start, name in generations[1:]])
+        names = np.array([name for start, name in generations], dtype=object)
+        return names[np.searchsorted(starts, birth_years, side='right')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic suicide rate csv')
+    parser.add_argument('num_rows', type=int)
+    parser.add_argument('file_name')
+    parser.add_argument('--countries', type=int, default=100)
+    parser.add_argument('--years', type=int, nargs=2, default=[1985, 2016], help='first and last year')
+    parser.add_argument('--seed', type=int, default=1)
+    arguments = parser.parse_args()
+    generator = DatasetGenerator(arguments.num_rows, arguments.countries, arguments.years, arguments.seed)
+    print("wrote", generator.write(arguments.file_name), "rows to", arguments.file_name)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,91 @@
 import pandas as pd
 import numpy as np
 import networkx as nx
-from matplotlib import pyplot as plt
+
+from AnalyticsEngine import AnalyticsEngine
+from ColorPalette import getColors
+from CommunityEngine import CommunityEngine
 
 class GraphAnalytics:
-    def __init__(self, largestComponent):
+    def __init__(self, largestComponent, renderer=None):
+        """ With a GraphRenderer, figures are written to files in the background instead of shown """
         self.G = largestComponent
+        self.renderer = renderer
+        # The latest value of every measure with the mode that produced it
+        self.analysis = dict()
+        # Community sweep results by resolution (see detectCommunities)
+        self.communities = dict()
+        self.__community_engine = None
 
-    def getGraphAnalysis(self):
+    def getGraphAnalysis(self, processes=1, distance_mode='exact', time_budget=None):
+        """ distance_mode='exact' computes every eccentricity. distance_mode='bounded' only
+            runs the BFS needed to bound diameter and radius, stopping when the bounds meet or
+            after time_budget seconds, and reports the bounds.
+        """
+        if distance_mode not in {'exact', 'bounded'}: raise ValueError
+        engine = AnalyticsEngine(self.G)
         avg_degree = self.G.number_of_edges() / self.G.number_of_nodes()
         print("avg degree: ", avg_degree)
+        self.analysis['avg_degree'] = {'value': avg_degree, 'mode': 'exact'}
 
-        print("assortativity coefficient: ", nx.degree_assortativity_coefficient(self.G))
+        assortativity = engine.getDegreeAssortativity()
+        print("assortativity coefficient: ", assortativity)
+        self.analysis['assortativity'] = {'value': assortativity, 'mode': 'exact'}
 
-        print("diameter: ", nx.diameter(self.G))
-        print("radius: ", nx.radius(self.G))
+        if distance_mode == 'exact':
+            # Diameter and radius both come from one eccentricity computation
+            distance_measures = engine.getDistanceMeasures(processes=processes)
+            for measure in ('diameter', 'radius'):
+                value = distance_measures[measure]
+                self.analysis[measure] = {'value': value, 'lower': value, 'upper': value, 'mode': 'exact'}
+        else:
+            bounds = engine.getBoundedDistanceMeasures(time_budget=time_budget)
+            for measure in ('diameter', 'radius'):
+                lower, upper = bounds[measure]
+                self.analysis[measure] = {'value': lower if lower == upper else None, 'lower': lower,
+                                          'upper': upper, 'mode': 'bounded', 'bfs_count': bounds['bfs_count']}
+        for measure in ('diameter', 'radius'):
+            result = self.analysis[measure]
+            if result['lower'] == result['upper']:
+                print(measure + ": ", result['lower'], "(" + result['mode'] + ")")
+            else:
+                print(measure + ": ", [result['lower'], result['upper']], "(" + result['mode'] + ")")
 
         self.showCommunities()
 
         self.get_scale_free_plot()
 
-    def showCommunities(self):
-        pos = nx.nx_agraph.graphviz_layout(self.G, prog='neato')
-        partition = nx.community.louvain_communities(self.G, weight='weight', seed=1)
-        num_partitions = len(partition)
+    def detectCommunities(self, resolutions=(1.0,), seeds=(1,), processes=1):
+        """ Louvain communities at every resolution, run with every seed (in parallel when processes > 1).
+            Returns, per resolution, the best partition with its modularity and its stability across seeds.
+            Partitions are cached, so repeated sweeps and plots of the same graph do not recompute them.
+        """
+        if self.__community_engine is None:
+            self.__community_engine = CommunityEngine(self.G)
+        results = self.__community_engine.sweep(resolutions, seeds, processes)
+        self.communities.update(results)
+        for resolution, result in results.items():
+            print("resolution", resolution, "communities:", result['communities'], "modularity:",
+                  result['modularity'], "stability:", result['stability'])
+        return results
+
+    def showCommunities(self, filename='communities.png', resolution=1.0):
+        """ Colors the nodes by the stored partition at resolution (detected with seed 1 if there is none) """
+        if self.renderer is not None:
+            # Start the layout first so it runs while the communities are computed
+            self.renderer.submitLayout(self.G)
+        else:
+            pos = nx.nx_agraph.graphviz_layout(self.G, prog='neato')
+        if resolution not in self.communities:
+            self.detectCommunities([resolution])
+        partition = self.communities[resolution]['partition']
 
         color_map = self.getColormap_by_Louvain_Communities(partition)
+        if self.renderer is not None:
+            return self.renderer.drawGraph(self.G, filename, node_color=color_map)
 
+        # pyplot is only imported when a figure is shown, so headless jobs never load it
+        from matplotlib import pyplot as plt
         # Plot figure of largest component - same as above I just wanted you to visually see what graph we are working with
         plt.figure(1)
         nx.draw_networkx(self.G, pos, node_color=color_map, alpha=0.8, node_size=40, with_labels=False)
@@ -39,30 +98,14 @@ class GraphAnalytics:
         plt.show()
 
     def getColormap_by_Louvain_Communities(self, partition):
-        nodelist = list(self.G.nodes())
-        self.colormap = ['y' for _ in nodelist]
-        num_partitions = len(partition)
-        #find which partition the node is in, and then make it that color
-        for i in range(0, num_partitions):
-            for j in range(0, len(nodelist)):
-                node = nodelist[j]
-                if partition[i].__contains__(node):
-                    if i == 0:
-                        self.colormap[j] = 'y'
-                    elif i == 1:
-                        self.colormap[j] = 'm'
-                    elif i == 2:
-                        self.colormap[j] = 'g'
-                    elif i == 3:
-                        self.colormap[j] = 'c'
-                    elif i == 4:
-                        self.colormap[j] = 'b'
-                    elif i == 5:
-                        self.colormap[j] = 'r'
-                    else:
-                        self.colormap[j] = 'k'
+        self.community_labels = self.getCommunityLabels(partition)
+        self.colormap = getColors(self.community_labels)
         return self.colormap
 
+    def getCommunityLabels(self, partition):
+        """ Index of the community of every node, aligned with self.G.nodes() (-1 if in none) """
+        return CommunityEngine.getLabels(partition, list(self.G.nodes()))
+
     def plot_degree_histogram(self, g, normalized=True):
         print("Creating histogram...")
         aux_y = nx.degree_histogram(g)
@@ -77,10 +120,13 @@ class GraphAnalytics:
         
         return aux_x, aux_y
 
-    def get_scale_free_plot(self):
+    def get_scale_free_plot(self, filename='degree_distribution.png'):
 
         aux_x, aux_y = self.plot_degree_histogram(self.G, normalized=False)
+        if self.renderer is not None:
+            return self.renderer.plotDegreeDistribution(aux_x, aux_y, filename)
 
+        from matplotlib import pyplot as plt
         plt.title('\nDegree Distribution (log-log scale)')
         plt.xlabel('Degree\n(log scale)')
         plt.ylabel('Number of Nodes\n(log scale)')
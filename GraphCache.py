@@ -0,0 +1,147 @@
+""" On-disk cache for built graphs.
+    A graph is stored as a node table plus compact edge arrays, one .npy file
+    per array, so that a warm start is a memory-mapped load instead of
+    re-reading, re-cleaning and re-binning the csv file.
+
+    The cache key combines the content hash of the source file, the node_types
+    schema, the binlist, the cleanDatabase rules (or the preprocessing pipeline
+    that replaced them), whether the graph is directed and whether composite
+    nodes are the full product of the values.
+    Changing any of them gives a different key, so stale entries are never
+    loaded.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import networkx as nx
+import numpy as np
+
+from CompactGraph import CompactGraph
+import DatabaseManager
+
+# Bump when the on-disk layout changes
+cache_format_version = 1
+
+
+class GraphCache:
+    def __init__(self, cache_dir='cache'):
+        self.cache_dir = cache_dir
+
+    ##################
+    # Public Methods #
+    ##################
+    @staticmethod
+    def getFileHash(file_name, block_size=1 << 20):
+        file_hash = hashlib.sha256()
+        with open(file_name, 'rb') as source:
+            for block in iter(lambda: source.read(block_size), b''):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def getGraphFingerprint(G, weight=None):
+        """ Hash of the nodes and edges of G, and of the weight attribute if one is named """
+        fingerprint = hashlib.sha256(str(G.is_directed()).encode())
+        for node in sorted(map(str, G.nodes())):
+            fingerprint.update(node.encode() + b'\0')
+        fingerprint.update(b'\1')
+        if G.is_directed():
+            edges = ['\0'.join(map(str, (u, v))) + '\0' + str(w) for u, v, w in G.edges(data=weight)]
+        else:
+            edges = ['\0'.join(sorted(map(str, (u, v)))) + '\0' + str(w) for u, v, w in G.edges(data=weight)]
+        for edge in sorted(edges):
+            fingerprint.update(edge.encode() + b'\1')
+        return fingerprint.hexdigest()
+
+    def getKey(self, file_name, node_types, binlist, directed_graph, full_product=False, pipeline=None):
+        """ pipeline is the PreprocessingPipeline that replaced the default cleaning and binning, if any """
+        description = {'version': cache_format_version,
+                       'source': self.getFileHash(file_name),
+                       'node_types': [list(categories) for categories in node_types],
+                       'binlist': list(binlist),
+                       'excluded_values': {k: sorted(v) for k, v in DatabaseManager.excluded_values.items()},
+                       'directed_graph': bool(directed_graph),
+                       'full_product': bool(full_product)}
+        if pipeline is not None:
+            description['pipeline'] = pipeline.key
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()[:32]
+
+    def load(self, key, compact=False):
+        """ Returns (G, nodes_by_attribute_dict), or None if the key is not cached.
+            With compact=True, G is a CompactGraph built straight from the stored arrays.
+        """
+        entry = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(entry):
+            return None
+        with open(os.path.join(entry, 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+        arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+                  for name in ('labels', 'sources', 'targets', 'weights', 'member_nodes', 'member_types')}
+        labels = arrays['labels'].tolist()
+        if compact:
+            G = CompactGraph(meta['directed_graph'], labels).addEdges(
+                np.asarray(labels, dtype=object)[arrays['sources']],
+                np.asarray(labels, dtype=object)[arrays['targets']], arrays['weights'])
+        else:
+            if meta['directed_graph']:
+                G = nx.empty_graph(create_using=nx.DiGraph)
+            else:
+                G = nx.empty_graph()
+            G.add_nodes_from(labels)
+            G.add_weighted_edges_from(zip([labels[i] for i in arrays['sources'].tolist()],
+                                          [labels[i] for i in arrays['targets'].tolist()],
+                                          arrays['weights'].tolist()))
+        nodes_by_attribute_dict = {node_type: set() for node_type in meta['node_types']}
+        for i, t in zip(arrays['member_nodes'].tolist(), arrays['member_types'].tolist()):
+            nodes_by_attribute_dict[meta['node_types'][t]].add(labels[i])
+        return G, nodes_by_attribute_dict
+
+    def save(self, key, G, nodes_by_attribute_dict):
+        """ G is a networkx graph or a CompactGraph """
+        labels = list(G.nodes())
+        index = {node: i for i, node in enumerate(labels)}
+        if isinstance(G, CompactGraph):
+            sources, targets, weights = G.getEdgeArrays()
+            if np.array_equal(weights, np.round(weights)):
+                weights = weights.astype(np.int64)  # stored like the weights of the networkx backend
+        else:
+            edges = list(G.edges(data='weight', default=1))
+            sources = np.array([index[u] for u, v, w in edges], dtype=np.int32)
+            targets = np.array([index[v] for u, v, w in edges], dtype=np.int32)
+            weights = np.array([w for u, v, w in edges])
+        node_types = list(nodes_by_attribute_dict.keys())
+        member_nodes = []
+        member_types = []
+        for t, node_type in enumerate(node_types):
+            for node in nodes_by_attribute_dict[node_type]:
+                member_nodes += [index[node]]
+                member_types += [t]
+        arrays = {'labels': np.array(labels, dtype=str),
+                  'sources': sources,
+                  'targets': targets,
+                  'weights': weights,
+                  'member_nodes': np.array(member_nodes, dtype=np.int32),
+                  'member_types': np.array(member_types, dtype=np.int16)}
+        # Write to a temporary directory first so a crash never leaves a half written entry
+        entry = os.path.join(self.cache_dir, key)
+        staging = entry + '.tmp{}'.format(os.getpid())
+        os.makedirs(staging, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(staging, name + '.npy'), array)
+        with open(os.path.join(staging, 'meta.json'), 'w') as meta_file:
+            json.dump({'node_types': node_types, 'directed_graph': G.is_directed()}, meta_file)
+        if os.path.isdir(entry):
+            shutil.rmtree(staging)
+        else:
+            os.replace(staging, entry)
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
@@ -9,9 +9,10 @@
     March 2023
 """
 import networkx as nx
-from matplotlib import pyplot as plt
 
 from DatabaseManager import DatabaseManager
+from GraphExporter import GraphExporter
+from ProjectionEngine import ProjectionEngine
 
 
 class GraphManager:
@@ -31,13 +32,18 @@ class GraphManager:
         edge_set = self.database.getEdges(category_1,category_2)
         H = self.__edgesetToSubgraph(edge_set)
         return H
-    def extractProjectionGraph(self,categories):
+    def extractProjectionGraph(self,categories,weight = None,return_matrix = False,min_weight = None,top_k = None,alpha = None):
         """ Project out the movie to see relationships
-            between other database categories
+            between other database categories.
+            weight, return_matrix and the pruning options min_weight, top_k and alpha
+            are passed on to ProjectionEngine.
         """
-        edge_set = self.__extractProjectionEdges(categories)
-        H = self.__edgesetToSubgraph(edge_set)
-        return H
+        node_set = set()
+        for node_type in categories:
+            node_set = node_set.union(self.database.getNodesOfType(node_type))
+        engine = ProjectionEngine(self.G)
+        if return_matrix: return engine.project(node_set,weight,min_weight,top_k,alpha)
+        return engine.projectToGraph(node_set,weight,min_weight,top_k,alpha)
     def extractLargestComponent(self,subgraph):
         largest_cc = max(nx.connected_components(subgraph),key=len)
         subgraph = subgraph.subgraph(largest_cc).copy()
@@ -62,11 +68,9 @@ class GraphManager:
     # Miscellaneous Public Utilities #
     ##################################
     def exportToGephi(self,gephi_filename):
-        #nx.write_gexf(G,gephi_filename)
-        nx.write_gexf(self.G,"figures/SuicideRiskGraph.gexf")   
+        return GraphExporter().writeGEXF(self.G,gephi_filename)
     def exportSubgraphToGephi(self,H,gephi_filename):
-        #nx.write_gexf(G,gephi_filename)
-        nx.write_gexf(H,"figures/SuicideRiskGraph_Subgraph.gexf")   
+        return GraphExporter().writeGEXF(H,gephi_filename)
     
     ##########################
     # Private Helper Methods #
@@ -92,22 +96,3 @@ class GraphManager:
         for edge in edge_set:
             H.add_edge(edge[0],edge[1])
         return H
-    def __extractProjectionEdges(self,categories):
-        """ Project out the movie to see relationships
-            between other database categories
-        """
-        # The projections is performed by finding all paths two steps or fewer
-        two_step_paths = dict(nx.all_pairs_shortest_path_length(self.G,cutoff=2))
-        node_set = set()
-        # Extract all the node types of interest
-        for node_type in categories:
-            node_set = node_set.union(self.database.getNodesOfType(node_type))
-        # Select only two step paths between nodes of interest
-        edge_set = set()
-        for node_source in node_set:
-            destination_dictionary = two_step_paths[node_source]
-            node_destinations = set([k for k,v in destination_dictionary.items() if v == 2])
-            node_destinations = node_destinations.intersection(node_set)
-            for node_destination in node_destinations:
-                edge_set.add((node_source,node_destination))
-        return edge_set
@@ -8,23 +8,96 @@
 
     March 2023
 """
+import contextlib
+import itertools
+
 import networkx as nx
-from matplotlib import pyplot as plt
+import pandas as pd
 
-from DatabaseManager import DatabaseManager
+from ColorPalette import getColors
+from CompactGraph import CompactGraph
+from DatabaseManager import DatabaseManager, default_binlist
+from GraphExporter import GraphExporter
+from GraphCache import GraphCache
+from ProjectionEngine import ProjectionEngine
+from QueryEngine import QueryEngine
+from RowEdgeIndex import RowEdgeIndex
+from TemporalGraph import TemporalGraph
 import numpy as np
 
 
 class GraphManager:
-    def __init__(self, file_name, directed_graph=False, node_types=[['country', 'age', 'sex'], ['suicides_per_100k_bins']]):
-        self.database = DatabaseManager(file_name)
+    def __init__(self, file_name, directed_graph=False, node_types=[['country', 'age', 'sex'], ['suicides_per_100k_bins']],
+                 vectorized=True, categorical=False, binlist=default_binlist, cache_dir=None, chunksize=None,
+                 database=None, backend='networkx', full_product=False, profiler=None, pipeline=None):
+        """ With cache_dir set, the built graph is stored in a GraphCache there and later
+            constructions with the same file contents and schema load it instead of rebuilding.
+            With chunksize set, the csv is streamed chunksize rows at a time and the full
+            DataFrame is never built (the vectorized edge path is always used).
+            In both cases the database is only read if a method actually needs the rows.
+            database, if given, is an already loaded DatabaseManager to build from instead of file_name.
+            backend='compact' stores the graph as a CompactGraph (integer node ids, a label table and
+            CSR edge arrays) in self.core; the networkx graph self.G is then only built when it is used.
+            Composite nodes are the combinations of category values that occur in the rows. With
+            full_product=True every combination of the values is a node, whether it occurs or not.
+            profiler, a PipelineProfiler, measures the node build and the edge build as separate stages.
+            pipeline, a PreprocessingPipeline, replaces the default cleaning and binning of the rows.
+            Quantile bins are fitted on the whole file, so they cannot be combined with chunksize.
+        """
+        if backend not in {'networkx', 'compact'}: raise ValueError
+        if chunksize is not None and pipeline is not None and not pipeline.isFixed(): raise ValueError
+        self.file_name = file_name
+        self.categorical = categorical
+        self.binlist = binlist
+        self.pipeline = pipeline
+        self.__database = database
+        self.__appended_rows = []
+        self.__category_nodes = None
+        self.__projections = dict()
+        self.__query_engine = None
+        self.__temporal_graphs = dict()
+        self.__row_edge_index = None
+        # Incremented whenever the graph changes, so callers holding results derived from it can tell they are stale
+        self.version = 0
         self.node_types = node_types
-        if directed_graph:
-            self.G = nx.empty_graph(create_using=nx.DiGraph)
+        self.directed_graph = directed_graph
+        self.vectorized = vectorized
+        self.chunksize = chunksize
+        self.backend = backend
+        self.full_product = full_product
+        self.profiler = profiler
+        if backend == 'compact':
+            self.core = CompactGraph(directed_graph)
+            self.__G = None
         else:
-            self.G = nx.empty_graph()
+            self.core = None
+            if directed_graph:
+                self.__G = nx.empty_graph(create_using=nx.DiGraph)
+            else:
+                self.__G = nx.empty_graph()
         self.nodes_by_attribute_dict = dict()
-        self.__initializeGraph()
+        if cache_dir is None:
+            self.__initializeGraph()
+        else:
+            self.__initializeGraphFromCache(GraphCache(cache_dir))
+        self.__updateNodeTypeLabels()
+
+    @property
+    def database(self):
+        if self.__database is None:
+            self.__database = DatabaseManager(self.file_name, categorical=self.categorical, binlist=self.binlist,
+                                              pipeline=self.pipeline)
+            for new_rows in self.__appended_rows:
+                self.__mergeRows(new_rows)
+            self.__appended_rows = []
+        return self.__database
+
+    @property
+    def G(self):
+        if self.__G is None:
+            # Compact backend: export to networkx on first use
+            self.__G = self.core.toNetworkx()
+        return self.__G
 
     ############################################
     # Public Extraction and Projection Methods #
@@ -34,16 +107,28 @@ class GraphManager:
         H = self.__edgesetToSubgraph(edge_set)
         return H
 
-    def extractProjectionGraph(self, categories):
+    def extractProjectionGraph(self, categories, weight=None, return_matrix=False, min_weight=None, top_k=None,
+                               alpha=None):
         """ Project out the movie to see relationships
-            between other database categories
+            between other database categories.
+            weight selects how edge weights are combined along each two-step path
+            (see ProjectionEngine.project); weight='count' puts the number of shared
+            neighbours on every edge. min_weight, top_k and alpha (backbone significance)
+            prune the projection while it is generated. With return_matrix=True the sparse
+            projection matrix and its node list are returned instead of a graph.
         """
-        if categories is list:
-            edge_set = self.__extractProjectionEdges(categories)
-        else:
-            edge_set = self.__extractProjectionEdges([categories])
-        H = self.__edgesetToSubgraph(edge_set)
-        return H
+        if not isinstance(categories, list):
+            categories = [categories]
+        engine = ProjectionEngine(self.__getBackendGraph())
+        # Projections are cached until the graph changes (see append)
+        key = (tuple(categories), weight, min_weight, top_k, alpha)
+        if key not in self.__projections:
+            self.__projections[key] = engine.project(self.__getNodesOfTypes(categories), weight, min_weight, top_k,
+                                                     alpha)
+        P, node_list = self.__projections[key]
+        if return_matrix:
+            return P, node_list
+        return engine.matrixToGraph(P, node_list, weight is not None)
 
     @staticmethod
     def extractLargestComponent(subgraph):
@@ -54,66 +139,316 @@ class GraphManager:
     def getGraph_of_Database(self):
         return self.G
 
+    def getQueryEngine(self):
+        """ Indexed lookups over the graph (see QueryEngine). The indexes are built on first use
+            and rebuilt after the graph changes.
+        """
+        if self.__query_engine is None:
+            core = self.core if self.core is not None else CompactGraph.fromNetworkx(self.G)
+            self.__query_engine = QueryEngine(core, self.node_types, self.nodes_by_attribute_dict,
+                                              self.__getNodeValues())
+        return self.__query_engine
+
+    def getTemporalGraph(self, time_category='year'):
+        """ Edge weights per value of time_category over the graph's node table (see TemporalGraph),
+            counted in one pass over the rows (chunk by chunk when chunksize is set).
+            Cached until the graph changes.
+        """
+        if time_category not in self.__temporal_graphs:
+            edge_frame = pd.concat([self.__getWeightedEdgeFrame(database, time_category)
+                                    for database in self.__getDatabases()],
+                                   ignore_index=True)
+            self.__temporal_graphs[time_category] = TemporalGraph(self.__getBackendGraph().nodes(), edge_frame,
+                                                                  self.directed_graph)
+        return self.__temporal_graphs[time_category]
+
+    def getRowEdgeIndex(self):
+        """ Index from every source row to what it adds to every edge (see RowEdgeIndex), counted in
+            one pass over the rows (chunk by chunk when chunksize is set). Cached until the graph changes.
+        """
+        if self.__row_edge_index is None:
+            # Chunks keep every column, with the strings as categorical codes, so predicates can use
+            # the same columns whether or not the file was read in chunks
+            chunked = self.__database is None and self.chunksize is not None
+            row_frames = []
+            edge_frames = []
+            num_rows = 0
+            for database in self.__getDatabases():
+                edge_frame = self.__getWeightedEdgeFrame(database, by_row=True)
+                edge_frame['row'] += num_rows
+                edge_frames += [edge_frame]
+                row_frames += [self.__getCategoricalRows(database.dataframe) if chunked else database.dataframe]
+                num_rows += len(database.dataframe)
+            rows = row_frames[0] if len(row_frames) == 1 else self.__concatRows(row_frames)
+            self.__row_edge_index = RowEdgeIndex(self.__getBackendGraph().nodes(),
+                                                 rows, pd.concat(edge_frames, ignore_index=True),
+                                                 self.directed_graph)
+        return self.__row_edge_index
+
+    def getFilteredGraph(self, min_rate=None, max_rate=None, years=None, countries=None, predicate=None, **values):
+        """ The graph of the source rows that match the predicates (see RowEdgeIndex.getRowMask), e.g.
+            getFilteredGraph(min_rate=100) for the rows of suicide_rates_over_100.csv, or
+            getFilteredGraph(years=(1990, 1999), countries={'Albania', 'Japan'}).
+            The weights are masked from the row index, so no csv is read and no graph is rebuilt.
+            Returns a CompactGraph with the compact backend.
+        """
+        core = self.getRowEdgeIndex().getGraph(min_rate=min_rate, max_rate=max_rate, years=years,
+                                               countries=countries, predicate=predicate, **values)
+        return core if self.core is not None else core.toNetworkx()
+
     def getColormap_by_Nodetype(self, G=None):
-        """{'age','year','sex','country','suicides_per_100k_bins'}"""
+        """ One color per node of G (default the whole graph), by the position of its type in node_types """
         if G is None:
-            G = self.G
-        nodelist = list(G.nodes())
-        colormap = ['y' for _ in nodelist]
-        node_types = self.__get_node_types()
+            return getColors(self.node_type_labels)
+        return getColors([self.node_type_index.get(node, -1) for node in G.nodes()])
 
-        for i in range(len(G.nodes())):
-            node = nodelist[i]
-            if len(node_types) > 0 and node in self.nodes_by_attribute_dict[node_types[0]]:
-                colormap[i] = 'y'
-            elif len(node_types) > 1 and node in self.nodes_by_attribute_dict[node_types[1]]:
-                colormap[i] = 'm'
-            elif len(node_types) > 2 and node in self.nodes_by_attribute_dict[node_types[2]]:
-                colormap[i] = 'g'
-            elif len(node_types) > 3 and node in self.nodes_by_attribute_dict[node_types[3]]:
-                colormap[i] = 'c'
-            elif len(node_types) > 4 and node in self.nodes_by_attribute_dict[node_types[4]]:
-                colormap[i] = 'b'
-            elif len(node_types) > 5 and node in self.nodes_by_attribute_dict[node_types[5]]:
-                colormap[i] = 'r'
-            elif len(node_types) > 6 and node in self.nodes_by_attribute_dict[node_types[6]]:
-                colormap[i] = 'k'
-        return colormap
+    #############################
+    # Incremental Graph Updates #
+    #############################
+    def append(self, rows_or_csv):
+        """ Adds new rows to the graph without rebuilding it.
+            rows_or_csv is a csv file name, or a DataFrame or list of dicts with the csv columns.
+            The rows are cleaned and binned like the original file, new composite nodes are
+            added, the weights of existing edges are incremented in place and cached
+            projections are invalidated.
+        """
+        pipeline = self.pipeline
+        if pipeline is not None and not pipeline.isFixed():
+            # New rows get the quantile edges fitted on the original rows
+            pipeline = self.database.pipeline
+        if isinstance(rows_or_csv, str):
+            new_rows = DatabaseManager(rows_or_csv, categorical=self.categorical, binlist=self.binlist,
+                                       pipeline=pipeline)
+        else:
+            new_rows = DatabaseManager(self.file_name, self.categorical, self.binlist,
+                                       dataframe=pd.DataFrame(rows_or_csv), pipeline=pipeline)
+        # Step 1: Add the new composite nodes
+        if self.full_product:
+            # Only node types whose categories gained new values get new combinations
+            category_nodes = self.__getCategoryNodes()
+            changed_types = []
+            for categories in self.node_types:
+                for category in categories:
+                    new_values = new_rows.getNodesOfType(category) - category_nodes[category]
+                    if len(new_values) > 0:
+                        category_nodes[category] |= new_values
+                        changed_types += [categories]
+            self.__addCompositeNodes(category_nodes, [categories for categories in self.node_types
+                                                      if categories in changed_types])
+        else:
+            self.__addObservedNodes(self.__getObservedNodes(new_rows))
+
+        # Step 2: Increment the weights of the edges the new rows contribute to
+        edge_frame = self.__getWeightedEdgeFrame(new_rows)
+        if self.core is not None:
+            self.core = self.core.addEdges(edge_frame['source'].to_numpy(), edge_frame['target'].to_numpy(),
+                                           edge_frame['weight'].to_numpy())
+            self.__G = None
+        else:
+            for u, v, w in zip(edge_frame['source'].tolist(), edge_frame['target'].tolist(),
+                               edge_frame['weight'].tolist()):
+                if self.G.has_edge(u, v):
+                    self.G[u][v]['weight'] += w
+                else:
+                    self.G.add_edge(u, v, weight=w)
+
+        # Step 3: Keep the rows and the derived results consistent with the graph
+        if self.__database is None:
+            self.__appended_rows += [new_rows]
+        else:
+            self.__mergeRows(new_rows)
+        self.__projections = dict()
+        self.__query_engine = None
+        self.__temporal_graphs = dict()
+        self.__row_edge_index = None
+        self.__updateNodeTypeLabels()
+        self.version += 1
 
     ##################################
     # Miscellaneous Public Utilities #
     ##################################
+    def export(self, path, G=None, file_format=None):
+        """ Streams G (default the whole graph) to path as GEXF, GraphML, or Parquet/Arrow node and
+            edge tables, chosen by file_format or the extension of path (see GraphExporter).
+            Node types are exported as a node attribute. Returns the written paths.
+        """
+        node_types = self.__get_node_types()
+        type_names = {node: node_types[label] for node, label in self.node_type_index.items()}
+        if G is None:
+            G = self.__getBackendGraph()
+        return GraphExporter().write(G, path, type_names, file_format)
+
     def exportToGephi(self, gephi_filename):
-        # nx.write_gexf(G,gephi_filename)
-        nx.write_gexf(self.G, "figures/SuicideRiskGraph.gexf")
+        return self.export(gephi_filename, file_format='gexf')
 
     @staticmethod
     def exportSubgraphToGephi(H, gephi_filename):
-        # nx.write_gexf(G,gephi_filename)
-        nx.write_gexf(H, "figures/SuicideRiskGraph_Subgraph.gexf")
+        return GraphExporter().writeGEXF(H, gephi_filename)
 
     ##########################
     # Private Helper Methods #
     ##########################
     # Modified in version 2 by Jonathan
     def __initializeGraph(self):
+        if self.chunksize is not None:
+            with self.__stage('chunked build'):
+                self.__initializeGraphByChunks()
+            return
         # Step 1: Create graph nodes based on self.node_types
-        for categories in self.node_types:
-            node_sets = []
-            for category in categories:
-                node_sets += [self.database.getNodesOfType(category)]
-
-            concat = set(np.array(list(node_sets[0]), dtype=str))  # initialize and make every category a string
-            for i in range(1, len(node_sets)):
-                original_concat = concat.copy()
-                concat = []
-                for node in original_concat:
-                    for node2 in node_sets[i]:
-                        concat += [str(node) + ', ' + str(node2)]
-            concat = set(concat)
+        with self.__stage('node build'):
+            if self.full_product:
+                self.__addCompositeNodes(self.__getCategoryNodes())
+            else:
+                self.__addObservedNodes(self.__getObservedNodes(self.database))
+
+        # Step 2: Initialize edge set (the compact backend has no row-by-row path)
+        with self.__stage('edge build'):
+            if self.vectorized or self.core is not None:
+                self.__initializeEdgesVectorized()
+            else:
+                self.__initializeEdgesByRow()
+
+    def __stage(self, name):
+        return self.profiler.stage(name) if self.profiler is not None else contextlib.nullcontext()
+
+    def __initializeGraphByChunks(self):
+        """ Accumulates the composite nodes (or the unique values of every category) and the
+            weighted edge counts one chunk at a time, so memory is bounded by the chunk plus the graph
+        """
+        category_nodes = {category: set() for categories in self.node_types for category in categories}
+        observed_nodes = [set() for categories in self.node_types]
+        edge_frame = None
+        for chunk in DatabaseManager.readChunks(self.file_name, self.chunksize, self.categorical, self.binlist,
+                                                self.pipeline):
+            if self.full_product:
+                for category in category_nodes:
+                    category_nodes[category] |= chunk.getNodesOfType(category)
+            else:
+                for nodes, chunk_nodes in zip(observed_nodes, self.__getObservedNodes(chunk)):
+                    nodes |= chunk_nodes
+            chunk_edges = self.__getWeightedEdgeFrame(chunk)
+            if edge_frame is None:
+                edge_frame = chunk_edges
+            else:
+                edge_frame = pd.concat([edge_frame, chunk_edges], ignore_index=True)
+                edge_frame = edge_frame.groupby(['source', 'target'], sort=False)['weight'].sum().reset_index()
+        if self.full_product:
+            self.__category_nodes = category_nodes
+            self.__addCompositeNodes(category_nodes)
+        else:
+            self.__addObservedNodes(observed_nodes)
+        if edge_frame is not None:
+            self.__addEdgeFrame(edge_frame)
+
+    def __getDatabases(self):
+        """ The rows as DatabaseManagers: the chunks of the csv and the appended rows when chunksize is set
+            and the whole database was never loaded, otherwise the database
+        """
+        if self.__database is None and self.chunksize is not None:
+            databases = DatabaseManager.readChunks(self.file_name, self.chunksize, self.categorical, self.binlist,
+                                                   self.pipeline)
+            return itertools.chain(databases, self.__appended_rows)
+        return [self.database]
+
+    @staticmethod
+    def __getCategoricalRows(dataframe):
+        """ dataframe with its string columns stored as categoricals """
+        strings = [column for column, dtype in dataframe.dtypes.items()
+                   if pd.api.types.is_string_dtype(dtype) and not isinstance(dtype, pd.CategoricalDtype)]
+        return dataframe.astype({column: 'category' for column in strings})
+
+    @staticmethod
+    def __concatRows(row_frames):
+        """ The rows of every frame, keeping the columns that are categorical in all of them categorical """
+        rows = pd.concat(row_frames, ignore_index=True)
+        for column in rows.columns:
+            columns = [frame[column] for frame in row_frames if column in frame.columns]
+            if len(columns) == len(row_frames) and \
+                    all(isinstance(values.dtype, pd.CategoricalDtype) for values in columns) and \
+                    not isinstance(rows[column].dtype, pd.CategoricalDtype):
+                # Categoricals with different categories concatenate to strings
+                rows[column] = pd.api.types.union_categoricals(columns, ignore_order=True)
+        return rows
+
+    def __getNodeValues(self):
+        """ Node type -> node name -> the category values of the node. The values come from the
+            category codes of the rows (or, with full_product, the products of the category values),
+            so values that contain ', ' are kept whole.
+        """
+        node_values = {self.__get_node_type(categories): dict() for categories in self.node_types}
+        if self.full_product:
+            category_nodes = self.__getCategoryNodes()
+            for categories in self.node_types:
+                for combination in itertools.product(*[[str(node) for node in category_nodes[category]]
+                                                       for category in categories]):
+                    node_values[self.__get_node_type(categories)][', '.join(combination)] = combination
+            return node_values
+        for database in self.__getDatabases():
+            for categories in self.node_types:
+                codes, labels = database.getCompositeCodes(categories)
+                node_codes, first_rows = np.unique(codes, return_index=True)
+                values = []
+                for category in categories:
+                    category_codes, category_labels = database.getCategoryCodes(category)
+                    values += [np.asarray(category_labels, dtype=object)[category_codes[first_rows]].tolist()]
+                node_values[self.__get_node_type(categories)].update(
+                    zip(np.asarray(labels, dtype=object)[node_codes].tolist(), zip(*values)))
+        return node_values
+
+    def __getCategoryNodes(self):
+        """ The values of every category used by self.node_types """
+        if self.__category_nodes is None:
+            self.__category_nodes = dict()
+            for categories in self.node_types:
+                for category in categories:
+                    self.__category_nodes[category] = self.database.getNodesOfType(category)
+        return self.__category_nodes
+
+    def __addCompositeNodes(self, category_nodes, node_types=None):
+        """ With full_product, composite nodes are the Cartesian product of the values of their categories """
+        if node_types is None:
+            node_types = self.node_types
+        for categories in node_types:
+            node_sets = [[str(node) for node in category_nodes[category]] for category in categories]
+            concat = {', '.join(combination) for combination in itertools.product(*node_sets)}
             self.__addNodes(concat, categories)
 
-        # Step 2: Initialize edge set
+    def __getObservedNodes(self, database):
+        """ The composite nodes of every node type that occur in the rows of a DatabaseManager """
+        return [database.getCompositeNodes(categories) for categories in self.node_types]
+
+    def __addObservedNodes(self, observed_nodes):
+        """ Adds the observed composite nodes (aligned with node_types) that are not nodes yet """
+        for categories, nodes in zip(self.node_types, observed_nodes):
+            existing_nodes = self.nodes_by_attribute_dict.get(self.__get_node_type(categories))
+            if existing_nodes is None:
+                self.__addNodes(nodes, categories)
+            elif not nodes <= existing_nodes:
+                self.__addNodes(existing_nodes | nodes, categories)
+
+    def __initializeGraphFromCache(self, cache):
+        key = cache.getKey(self.file_name, self.node_types, self.binlist, self.directed_graph, self.full_product,
+                           self.pipeline)
+        cached = cache.load(key, compact=self.core is not None)
+        if cached is None:
+            self.__initializeGraph()
+            cache.save(key, self.__getBackendGraph(), self.nodes_by_attribute_dict)
+        elif self.core is not None:
+            self.core, self.nodes_by_attribute_dict = cached
+        else:
+            self.__G, self.nodes_by_attribute_dict = cached
+
+    def __mergeRows(self, new_rows):
+        dataframe = pd.concat([self.__database.dataframe, new_rows.dataframe], ignore_index=True)
+        if self.categorical:
+            # Categoricals with different categories concatenate to object columns
+            for category, dtype in new_rows.dataframe.dtypes.items():
+                if isinstance(dtype, pd.CategoricalDtype):
+                    dataframe[category] = dataframe[category].astype('category')
+        self.__database.dataframe = dataframe
+
+    def __initializeEdgesByRow(self):
+        """ Original row-by-row edge construction. Kept as the reference for the vectorized path """
         for index, row in self.database.dataframe.iterrows():
             nodes = []
             for categories in self.node_types:
@@ -129,11 +464,104 @@ class GraphManager:
                     else:
                         self.G.add_weighted_edges_from([(nodes[i], nodes[j], 1)])
 
+    def __initializeEdgesVectorized(self):
+        """ Same weights as __initializeEdgesByRow, but the composite node keys are integer
+            codes built column-wise and the weights are counted in one pass over all node-type pairs
+        """
+        self.__addEdgeFrame(self.__getWeightedEdgeFrame(self.database))
+
+    def __addEdgeFrame(self, edge_frame):
+        if self.core is not None:
+            self.core = self.core.addEdges(edge_frame['source'].to_numpy(), edge_frame['target'].to_numpy(),
+                                           edge_frame['weight'].to_numpy())
+            return
+        self.G.add_weighted_edges_from(zip(edge_frame['source'].tolist(),
+                                           edge_frame['target'].tolist(),
+                                           edge_frame['weight'].tolist()))
+
+    def __getWeightedEdgeFrame(self, database, time_category=None, by_row=False):
+        """ Returns a DataFrame with columns source, target, weight for the rows of a DatabaseManager.
+            The counting is done on integer node codes; labels are only looked up for unique edges.
+            With time_category, the weights are counted per value of that column, held in a time column.
+            With by_row, the weights are counted per row, held in a row column (the row position).
+        """
+        group_column = 'row' if by_row else 'time'
+        grouped = by_row or time_category is not None
+        node_codes = []
+        node_labels = []
+        for categories in self.node_types:
+            codes, labels = database.getCompositeCodes(categories)
+            node_codes += [codes]
+            node_labels += [labels]
+        if len(node_codes) < 2 or len(database.dataframe) == 0:
+            edge_frame = pd.DataFrame({'source': [], 'target': [], 'weight': []})
+            if grouped:
+                edge_frame.insert(0, group_column, np.zeros(0, dtype=np.int64) if by_row else [])
+            return edge_frame
+        # One id space for all node types, so equal labels are the same node like in the row loop.
+        # Sorting the labels makes the undirected edge orientation the same for every chunk.
+        offsets = np.cumsum([0] + [len(labels) for labels in node_labels])
+        label_ids, unique_labels = pd.factorize(pd.Series(np.concatenate(node_labels), dtype=object), sort=True)
+        sources = []
+        targets = []
+        for i in range(len(node_codes)):
+            for j in range(i + 1, len(node_codes)):
+                sources += [label_ids[offsets[i] + node_codes[i]]]
+                targets += [label_ids[offsets[j] + node_codes[j]]]
+        sources = np.concatenate(sources)
+        targets = np.concatenate(targets)
+        if not self.directed_graph:
+            # (u, v) and (v, u) are the same undirected edge, so count them together
+            sources, targets = np.minimum(sources, targets), np.maximum(sources, targets)
+        num_ids = len(unique_labels)
+        edge_ids = sources.astype(np.int64) * num_ids + targets
+        if grouped:
+            # Every node-type pair repeats the rows, and so their times
+            if by_row:
+                times = np.arange(len(database.dataframe))
+                time_codes = times
+            else:
+                time_codes, times = pd.factorize(database.dataframe[time_category], sort=True,
+                                                 use_na_sentinel=False)
+            time_codes = np.tile(time_codes, len(edge_ids) // len(time_codes))
+            edge_ids = time_codes * (num_ids * num_ids) + edge_ids
+        edge_ids, weights = np.unique(edge_ids, return_counts=True)
+        if grouped:
+            time_codes, edge_ids = edge_ids // (num_ids * num_ids), edge_ids % (num_ids * num_ids)
+        edge_frame = pd.DataFrame({'source': np.asarray(unique_labels, dtype=object)[edge_ids // num_ids],
+                                   'target': np.asarray(unique_labels, dtype=object)[edge_ids % num_ids],
+                                   'weight': weights})
+        if grouped:
+            edge_frame.insert(0, group_column, np.asarray(times)[time_codes])
+        return edge_frame
+
+    def __updateNodeTypeLabels(self):
+        """ node_type_index maps a node to the position of its type in node_types and
+            node_type_labels holds the same integers aligned with self.G.nodes() (-1 for no type).
+            A node in several types gets the first one.
+        """
+        self.node_type_index = dict()
+        node_types = self.__get_node_types()
+        for label in reversed(range(len(node_types))):
+            for node in self.nodes_by_attribute_dict.get(node_types[label], ()):
+                self.node_type_index[node] = label
+        self.node_type_labels = np.array([self.node_type_index.get(node, -1)
+                                          for node in self.__getBackendGraph().nodes()],
+                                         dtype=np.int64)
+
     def __addNodes(self, node_set, categories):
         cat_type = self.__get_node_type(categories)
-        self.G.add_nodes_from(node_set)
+        if self.core is not None:
+            self.core = self.core.addNodes(node_set)
+            self.__G = None
+        else:
+            self.G.add_nodes_from(node_set)
         self.nodes_by_attribute_dict[cat_type] = node_set
 
+    def __getBackendGraph(self):
+        """ The CompactGraph with the compact backend, otherwise the networkx graph """
+        return self.core if self.core is not None else self.G
+
     def __addEdges(self, edge_set):
         self.G.add_edges_from(edge_set)
 
@@ -144,25 +572,12 @@ class GraphManager:
             H.add_edge(edge[0], edge[1])
         return H
 
-    def __extractProjectionEdges(self, categories):
-        """ Project out the movie to see relationships
-            between other database categories
-        """
-        # The projections are performed by finding all paths two steps or fewer
-        two_step_paths = dict(nx.all_pairs_shortest_path_length(self.G, cutoff=2))
+    def __getNodesOfTypes(self, categories):
         node_set = set()
         # Extract all the node types of interest
         for node_type in categories:
             node_set = node_set.union(self.nodes_by_attribute_dict[node_type])
-        # Select only two-step paths between nodes of interest
-        edge_set = set()
-        for node_source in node_set:
-            destination_dictionary = two_step_paths[node_source]
-            node_destinations = set([k for k, v in destination_dictionary.items() if v == 2])
-            node_destinations = node_destinations.intersection(node_set)
-            for node_destination in node_destinations:
-                edge_set.add((node_source, node_destination))
-        return edge_set
+        return node_set
 
     @staticmethod
     def __get_node_type(categories):
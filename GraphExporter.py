@@ -0,0 +1,178 @@
+""" Graph export to files for Gephi and downstream tools.
+    GEXF and GraphML are streamed to disk: the node labels are escaped once,
+    and the edges are written batch_size at a time (from the CSR arrays of a
+    CompactGraph, or straight from the edge view of a networkx graph), so no
+    XML tree and no copy of the edge list is ever held in memory.
+    Nodes are written with integer ids and the node name as their label, which
+    keeps the edge lines short.
+
+    The columnar export writes a node table (id, label, node_type) and an edge
+    list (source, target, weight) as Parquet files or Arrow (Feather) files.
+    Both need pyarrow, which is optional: the other formats work without it.
+
+    Every writer accepts a networkx graph or a CompactGraph.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import itertools
+import os
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+
+from CompactGraph import CompactGraph
+
+
+class GraphExporter:
+    # File extension -> format
+    formats = {'.gexf': 'gexf', '.graphml': 'graphml', '.parquet': 'parquet', '.arrow': 'arrow',
+               '.feather': 'arrow'}
+
+    def __init__(self, batch_size=1 << 16):
+        self.batch_size = batch_size
+
+    ##################
+    # Public Methods #
+    ##################
+    def write(self, G, path, node_types=None, file_format=None):
+        """ Writes G to path in the format given by file_format or the extension of path.
+            node_types optionally maps a node to the name of its type, exported as a node attribute.
+            Returns the written paths.
+        """
+        if file_format is None:
+            file_format = self.formats.get(os.path.splitext(path)[1].lower())
+        if file_format == 'gexf':
+            return [self.writeGEXF(G, path, node_types)]
+        if file_format == 'graphml':
+            return [self.writeGraphML(G, path, node_types)]
+        if file_format in {'parquet', 'arrow'}:
+            return self.writeTables(G, path, node_types, file_format)
+        raise ValueError
+
+    def writeGEXF(self, G, path, node_types=None):
+        labels, types = self.__getNodeTable(G, node_types, quoteattr)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                         '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                         '  <graph defaultedgetype="{}" mode="static">\n'.format(
+                             'directed' if G.is_directed() else 'undirected'))
+            if types is not None:
+                output.write('    <attributes class="node" mode="static">\n'
+                             '      <attribute id="0" title="node_type" type="string" />\n'
+                             '    </attributes>\n')
+            output.write('    <nodes>\n')
+            for start in range(0, len(labels), self.batch_size):
+                end = min(start + self.batch_size, len(labels))
+                if types is None:
+                    lines = ['      <node id="{}" label={} />\n'.format(i, labels[i]) for i in range(start, end)]
+                else:
+                    lines = ['      <node id="{}" label={}><attvalues><attvalue for="0" value={} />'
+                             '</attvalues></node>\n'.format(i, labels[i], types[i]) for i in range(start, end)]
+                output.write(''.join(lines))
+            output.write('    </nodes>\n    <edges>\n')
+            edge_id = 0
+            for sources, targets, weights in self.__getEdgeBatches(G):
+                output.write(''.join(
+                    '      <edge id="{}" source="{}" target="{}" weight="{}" />\n'.format(i, u, v, w)
+                    for i, u, v, w in zip(range(edge_id, edge_id + len(sources)), sources, targets, weights)))
+                edge_id += len(sources)
+            output.write('    </edges>\n  </graph>\n</gexf>\n')
+        return path
+
+    def writeGraphML(self, G, path, node_types=None):
+        labels, types = self.__getNodeTable(G, node_types, escape)
+        weight_type = self.__getWeightType(G)
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                         '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                         '  <key id="d0" for="node" attr.name="label" attr.type="string" />\n')
+            if types is not None:
+                output.write('  <key id="d1" for="node" attr.name="node_type" attr.type="string" />\n')
+            output.write('  <key id="d2" for="edge" attr.name="weight" attr.type="{}" />\n'
+                         '  <graph edgedefault="{}">\n'.format(
+                             weight_type, 'directed' if G.is_directed() else 'undirected'))
+            for start in range(0, len(labels), self.batch_size):
+                end = min(start + self.batch_size, len(labels))
+                if types is None:
+                    lines = ['    <node id="n{}"><data key="d0">{}</data></node>\n'.format(i, labels[i])
+                             for i in range(start, end)]
+                else:
+                    lines = ['    <node id="n{}"><data key="d0">{}</data><data key="d1">{}</data></node>\n'.format(
+                        i, labels[i], types[i]) for i in range(start, end)]
+                output.write(''.join(lines))
+            for sources, targets, weights in self.__getEdgeBatches(G):
+                output.write(''.join(
+                    '    <edge source="n{}" target="n{}"><data key="d2">{}</data></edge>\n'.format(u, v, w)
+                    for u, v, w in zip(sources, targets, weights)))
+            output.write('  </graph>\n</graphml>\n')
+        return path
+
+    def writeTables(self, G, path, node_types=None, file_format='parquet'):
+        """ Writes path_nodes and path_edges tables (path without its extension) as Parquet or Arrow files.
+            Raises ImportError when pyarrow is not installed.
+        """
+        core = G if isinstance(G, CompactGraph) else CompactGraph.fromNetworkx(G)
+        sources, targets, weights = self.__getEdgeArrays(core)
+        nodes = pd.DataFrame({'id': np.arange(core.number_of_nodes(), dtype=np.int32),
+                              'label': pd.Series(core.labels.tolist(), dtype=object).map(str)})
+        if node_types is not None:
+            nodes['node_type'] = pd.Series([node_types.get(label) for label in core.labels.tolist()], dtype=object)
+        edges = pd.DataFrame({'source': sources, 'target': targets, 'weight': weights})
+        base = os.path.splitext(path)[0]
+        extension = '.parquet' if file_format == 'parquet' else '.arrow'
+        paths = [base + '_nodes' + extension, base + '_edges' + extension]
+        for table, table_path in zip((nodes, edges), paths):
+            if file_format == 'parquet':
+                table.to_parquet(table_path, engine='pyarrow', index=False)
+            else:
+                table.to_feather(table_path)
+        return paths
+
+    ###################
+    # Private Methods #
+    ###################
+    @staticmethod
+    def __getNodeTable(G, node_types, quote):
+        """ The labels and node types (None without node_types) in node id order, escaped by quote """
+        labels = [str(label) for label in G.nodes()]
+        types = None
+        if node_types is not None:
+            types = [quote(str(node_types.get(label, ''))) for label in G.nodes()]
+        return [quote(label) for label in labels], types
+
+    def __getEdgeBatches(self, G):
+        """ Yields (sources, targets, weights) lists of node ids, batch_size edges at a time """
+        if isinstance(G, CompactGraph):
+            sources, targets, weights = self.__getEdgeArrays(G)
+            for start in range(0, len(sources), self.batch_size):
+                end = start + self.batch_size
+                yield sources[start:end].tolist(), targets[start:end].tolist(), weights[start:end].tolist()
+            return
+        index = {node: i for i, node in enumerate(G.nodes())}
+        edges = iter(G.edges(data='weight', default=1))
+        batch = list(itertools.islice(edges, self.batch_size))
+        while len(batch) > 0:
+            sources, targets, weights = zip(*batch)
+            yield [index[u] for u in sources], [index[v] for v in targets], list(weights)
+            batch = list(itertools.islice(edges, self.batch_size))
+
+    def __getWeightType(self, G):
+        """ 'long' if every edge weight is an integer, otherwise 'double'. It is declared before the
+            edges are written, so networkx weights are scanned once first (without copying the edges).
+        """
+        if isinstance(G, CompactGraph):
+            integral = np.issubdtype(self.__getEdgeArrays(G)[2].dtype, np.integer)
+        else:
+            integral = all(isinstance(w, (int, np.integer)) for _, _, w in G.edges(data='weight', default=1))
+        return 'long' if integral else 'double'
+
+    @staticmethod
+    def __getEdgeArrays(core):
+        sources, targets, weights = core.getEdgeArrays()
+        if np.array_equal(weights, np.round(weights)):
+            weights = weights.astype(np.int64)  # count weights stay integers like in the graph
+        return sources, targets, weights
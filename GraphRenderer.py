@@ -0,0 +1,180 @@
+""" Headless, non-blocking rendering of graphs and plots.
+    Figures are drawn on off-screen matplotlib Figure objects (no pyplot, no
+    window) and written to PNG/SVG files. Layouts run in a background pool of
+    worker processes while the caller keeps computing, and the computed
+    positions are cached by graph fingerprint, so plotting the same component
+    again skips the layout step. The position cache can also be kept on disk.
+    Large graphs, and machines without pygraphviz, use the built-in LayoutEngine.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import hashlib
+import os
+
+import networkx as nx
+import numpy as np
+
+from GraphCache import GraphCache
+from LayoutEngine import LayoutEngine
+
+
+class GraphRenderer:
+    def __init__(self, output_dir='figures', processes=None, cache_dir=None, neato_node_limit=2000):
+        """ output_dir is where figures are written. processes is the size of the layout pool.
+            cache_dir, if given, keeps the position cache on disk between runs.
+            Graphs with more than neato_node_limit nodes use the built-in LayoutEngine instead of graphviz.
+        """
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.neato_node_limit = neato_node_limit
+        self.__positions = dict()
+        # Latest built-in layout position of every node, used to warm-start later layouts
+        self.__node_positions = dict()
+        self.__pending_layouts = dict()
+        self.__layout_pool = ProcessPoolExecutor(max_workers=processes)
+        # Drawing waits on layouts, so it runs on threads instead of blocking the caller
+        self.__draw_pool = ThreadPoolExecutor(max_workers=1)
+        self.__jobs = []
+
+    ##################
+    # Public Methods #
+    ##################
+    @staticmethod
+    def getFingerprint(G, prog='neato'):
+        """ Identifies the structure of a graph (nodes and edges) together with the layout program """
+        return hashlib.sha256((prog + GraphCache.getGraphFingerprint(G)).encode()).hexdigest()
+
+    def submitLayout(self, G, prog='neato', warm_start=True):
+        """ Returns a Future holding the node positions. Cached positions are returned immediately.
+            prog is a graphviz program or 'builtin'. With warm_start, a built-in layout starts from
+            the positions its nodes had in earlier built-in layouts and only runs a short refinement.
+        """
+        if G.number_of_nodes() > self.neato_node_limit:
+            prog = 'builtin'
+        key = self.getFingerprint(G, prog)
+        if key in self.__positions:
+            return self.__getDone(self.__positions[key])
+        cached = self.__loadPositions(key)
+        if cached is not None:
+            self.__positions[key] = cached
+            return self.__getDone(cached)
+        if key in self.__pending_layouts:
+            return self.__pending_layouts[key]
+        initial_pos = None
+        if prog == 'builtin' and warm_start:
+            initial_pos = {node: self.__node_positions[node] for node in G if node in self.__node_positions}
+        future = self.__layout_pool.submit(_computeLayout, G, prog, initial_pos or None)
+        # The callback runs at once if the layout is already done, so the entry must exist first
+        self.__pending_layouts[key] = future
+        future.add_done_callback(lambda done: self.__storePositions(key, prog, done))
+        return future
+
+    def drawGraph(self, G, filename, node_color='y', legend=None, prog='neato', pos=None,
+                  node_size=40, alpha=0.8):
+        """ Lays out (unless pos is given) and draws G into output_dir/filename in the background.
+            legend is a list of (color, label) pairs. Returns a Future that completes when the file is written.
+        """
+        layout = self.__getDone(pos) if pos is not None else self.submitLayout(G, prog)
+        path = self.__getPath(filename)
+        job = self.__draw_pool.submit(_drawGraph, G, layout, path, node_color, legend, node_size, alpha)
+        self.__jobs += [job]
+        return job
+
+    def plotDegreeDistribution(self, degrees, counts, filename):
+        """ Log-log degree distribution written to output_dir/filename in the background """
+        path = self.__getPath(filename)
+        job = self.__draw_pool.submit(_plotDegreeDistribution, degrees, counts, path)
+        self.__jobs += [job]
+        return job
+
+    def wait(self):
+        """ Blocks until every submitted figure has been written and returns their paths """
+        paths = [job.result() for job in self.__jobs]
+        self.__jobs = []
+        return paths
+
+    def close(self):
+        self.wait()
+        self.__draw_pool.shutdown()
+        self.__layout_pool.shutdown()
+
+    ###################
+    # Private Methods #
+    ###################
+    @staticmethod
+    def __getDone(result):
+        future = Future()
+        future.set_result(result)
+        return future
+
+    def __getPath(self, filename):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, filename)
+
+    def __storePositions(self, key, prog, future):
+        self.__pending_layouts.pop(key, None)
+        if future.exception() is not None:
+            return
+        pos = future.result()
+        self.__positions[key] = pos
+        if prog == 'builtin':
+            self.__node_positions.update(pos)
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            nodes = list(pos.keys())
+            np.savez(os.path.join(self.cache_dir, key + '.npz'), nodes=np.array(nodes, dtype=object),
+                     coordinates=np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2))
+
+    def __loadPositions(self, key):
+        if self.cache_dir is None:
+            return None
+        path = os.path.join(self.cache_dir, key + '.npz')
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=True) as stored:
+            return {node: tuple(xy) for node, xy in zip(stored['nodes'].tolist(), stored['coordinates'].tolist())}
+
+
+####################################
+# Worker Functions (picklable)     #
+####################################
+def _computeLayout(G, prog, initial_pos=None):
+    if prog == 'builtin':
+        return LayoutEngine().getLayout(G, initial_pos=initial_pos)
+    try:
+        return nx.nx_agraph.graphviz_layout(G, prog=prog)
+    except ImportError:
+        # pygraphviz is not installed on every machine
+        return LayoutEngine().getLayout(G)
+
+
+def _drawGraph(G, layout, path, node_color, legend, node_size, alpha):
+    from matplotlib.figure import Figure
+    pos = layout.result()
+    figure = Figure()
+    ax = figure.add_subplot()
+    nx.draw_networkx(G, pos, ax=ax, node_color=node_color, alpha=alpha, node_size=node_size, with_labels=False)
+    if legend is not None:
+        for color, label in legend:
+            ax.plot([], [], linestyle='', marker='.', color=color, markersize=10, label=label)
+        ax.legend()
+    figure.savefig(path)
+    return path
+
+
+def _plotDegreeDistribution(degrees, counts, path):
+    from matplotlib.figure import Figure
+    figure = Figure()
+    ax = figure.add_subplot()
+    ax.set_title('\nDegree Distribution (log-log scale)')
+    ax.set_xlabel('Degree\n(log scale)')
+    ax.set_ylabel('Number of Nodes\n(log scale)')
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.plot(degrees, counts, 'o')
+    figure.savefig(path, bbox_inches='tight')
+    return path
@@ -0,0 +1,298 @@
+""" A persistent worker that keeps built graphs warm between jobs.
+    Short batch jobs spend much of their time importing numpy, pandas, scipy
+    and networkx and building the graph from the csv. The worker pays both
+    once: it imports the modules at startup, keeps the GraphManagers it has
+    built (the least recently used are dropped beyond max_managers) and
+    answers requests on a local socket. By default that is a unix socket
+    only its user can open (mode 0600); a TCP port on localhost is opt-in.
+
+    The protocol is one JSON object per line in each direction. A request is
+    {"command": ..., "file_name": ..., "options": {...}, ...arguments}, where
+    file_name is a csv inside the worker's data_dir and options are the
+    GraphManager keyword arguments in client_options. Together they identify
+    the warm manager. Every manager caches its graph in the worker's
+    cache_dir, if it has one. The reply is {"ok": true, "result": ...} or
+    {"ok": false, "error": ...}. Commands:
+      build      builds (or reuses) the graph and returns its size
+      analyze    avg degree, assortativity, diameter and radius of the
+                 largest component (distance_mode 'exact' or 'bounded')
+      filter     size of the graph of the rows matching min_rate, max_rate,
+                 years, countries and category values (see getFilteredGraph)
+      top_nodes  the nodes of node_type with the largest weighted degree
+      export     writes the graph to path inside the worker's output_dir
+                 (see GraphManager.export); without an output_dir the
+                 worker writes no files
+      status     the warm managers
+      shutdown   stops the worker after replying
+    Every connection is served on its own thread, so a client that stays
+    connected does not hold up the others, and a lock runs one request at a
+    time, so warm managers are never used by two jobs at once. Only figures
+    need matplotlib, and no command draws.
+
+    python GraphWorker.py --output-dir exports --cache-dir graph_cache
+    python GraphWorker.py --unix /tmp/graph_worker.sock
+    python GraphWorker.py --port 8575
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import argparse
+from collections import OrderedDict
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from AnalyticsEngine import AnalyticsEngine
+from GraphDatabaseManager_v2 import GraphManager
+
+default_address = os.path.join(tempfile.gettempdir(), 'graph_worker_{}.sock'.format(os.getuid()))
+# GraphManager arguments a client may set; the others are paths or python objects
+client_options = ('node_types', 'directed_graph', 'vectorized', 'categorical', 'binlist', 'chunksize', 'backend',
+                  'full_product')
+
+
+class GraphWorker:
+    def __init__(self, address=default_address, max_managers=4, output_dir=None, data_dir='.', cache_dir=None):
+        """ address is the path of a unix socket, or a (host, port) pair (port 0 picks a free port).
+            Requests read csv files inside data_dir. export requests write inside output_dir, and are
+            refused when it is None. Graph caches go to cache_dir, and are not kept when it is None.
+        """
+        self.max_managers = max_managers
+        self.output_dir = output_dir
+        self.data_dir = os.path.realpath(data_dir)
+        self.cache_dir = cache_dir
+        self.__lock = threading.Lock()
+        # (file_name, options key) -> warm manager, least recently used first
+        self.managers = OrderedDict()
+        # (file_name, options key) -> (graph version, largest component)
+        self.__components = dict()
+        self.__commands = {'build': self.__build, 'analyze': self.__analyze, 'filter': self.__filter,
+                           'top_nodes': self.__getTopNodes, 'export': self.__export, 'status': self.__getStatus}
+        worker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if len(line.strip()) == 0:
+                        continue
+                    reply = worker.handleRequest(line)
+                    self.wfile.write((json.dumps(reply, default=_toJson) + '\n').encode())
+                    self.wfile.flush()
+                    if reply.get('shutdown'):
+                        worker.server.shutdown()
+                        return
+
+        if isinstance(address, str):
+            self.__removeStaleSocket(address)
+            # Only the owner can connect to the socket
+            umask = os.umask(0o177)
+            try:
+                self.server = _UnixServer(address, Handler)
+            finally:
+                os.umask(umask)
+        else:
+            self.server = _TCPServer(address, Handler)
+        self.address = self.server.server_address
+
+    ##################
+    # Public Methods #
+    ##################
+    def serve(self):
+        """ Answers requests until a shutdown request """
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+    def handleRequest(self, line):
+        """ The reply to one request line, after the requests that came first on any connection """
+        try:
+            request = json.loads(line)
+            command = request.pop('command')
+            if command != 'shutdown' and command not in self.__commands:
+                raise ValueError('unknown command ' + str(command))
+            with self.__lock:
+                if command == 'shutdown':
+                    return {'ok': True, 'result': None, 'shutdown': True}
+                start = time.perf_counter()
+                result = self.__commands[command](**request)
+                return {'ok': True, 'result': result, 'seconds': time.perf_counter() - start}
+        except Exception as error:
+            return {'ok': False, 'error': type(error).__name__ + ': ' + str(error)}
+
+    def getManager(self, file_name, options=None):
+        """ The warm manager of file_name built with options, built on first use """
+        key = self.__getKey(file_name, options)
+        if key not in self.managers:
+            self.managers[key] = GraphManager(self.__getDataPath(file_name), cache_dir=self.cache_dir,
+                                              **json.loads(key[1]))
+            while len(self.managers) > self.max_managers:
+                dropped, _ = self.managers.popitem(last=False)
+                self.__components.pop(dropped, None)
+        self.managers.move_to_end(key)
+        return key, self.managers[key]
+
+    ###################
+    # Private Methods #
+    ###################
+    def __build(self, file_name, options=None):
+        warm = self.__getKey(file_name, options) in self.managers
+        _, manager = self.getManager(file_name, options)
+        graph = manager.core if manager.core is not None else manager.G
+        return {'nodes': graph.number_of_nodes(), 'edges': graph.number_of_edges(), 'warm': warm}
+
+    def __analyze(self, file_name, options=None, distance_mode='exact', time_budget=None, processes=1):
+        if distance_mode not in {'exact', 'bounded'}: raise ValueError
+        key, manager = self.getManager(file_name, options)
+        if key not in self.__components or self.__components[key][0] != manager.version:
+            G = manager.G.to_undirected() if manager.G.is_directed() else manager.G
+            self.__components[key] = (manager.version, GraphManager.extractLargestComponent(G))
+        component = self.__components[key][1]
+        engine = AnalyticsEngine(component)
+        result = {'nodes': component.number_of_nodes(), 'edges': component.number_of_edges(),
+                  'avg_degree': component.number_of_edges() / component.number_of_nodes(),
+                  'assortativity': engine.getDegreeAssortativity(), 'mode': distance_mode}
+        if distance_mode == 'exact':
+            distance_measures = engine.getDistanceMeasures(processes=processes)
+            result['diameter'] = distance_measures['diameter']
+            result['radius'] = distance_measures['radius']
+        else:
+            bounds = engine.getBoundedDistanceMeasures(time_budget=time_budget)
+            result['diameter'] = list(bounds['diameter'])
+            result['radius'] = list(bounds['radius'])
+        return result
+
+    def __filter(self, file_name, options=None, years=None, countries=None, **predicates):
+        _, manager = self.getManager(file_name, options)
+        H = manager.getFilteredGraph(years=tuple(years) if years is not None else None,
+                                     countries=set(countries) if countries is not None else None, **predicates)
+        return {'nodes': H.number_of_nodes(), 'edges': H.number_of_edges()}
+
+    def __getTopNodes(self, file_name, node_type, options=None, limit=10, neighbor_of=None, **values):
+        _, manager = self.getManager(file_name, options)
+        return manager.getQueryEngine().getTopNodes(node_type, limit, neighbor_of, **values)
+
+    def __getKey(self, file_name, options):
+        """ The managers key of a request. Options outside client_options are an error. """
+        options = dict(options or dict())
+        unknown = sorted(set(options) - set(client_options))
+        if len(unknown) > 0: raise ValueError('unsupported options ' + ', '.join(unknown))
+        return file_name, json.dumps(options, sort_keys=True)
+
+    def __getDataPath(self, file_name):
+        path = os.path.realpath(os.path.join(self.data_dir, file_name))
+        if os.path.commonpath([self.data_dir, path]) != self.data_dir:
+            raise ValueError('file_name must be inside the data_dir')
+        return path
+
+    def __export(self, file_name, path, options=None, file_format=None):
+        """ path is relative to output_dir and must stay inside it """
+        if self.output_dir is None: raise ValueError('the worker has no output_dir')
+        output_dir = os.path.realpath(self.output_dir)
+        path = os.path.realpath(os.path.join(output_dir, path))
+        if os.path.commonpath([output_dir, path]) != output_dir or path == output_dir:
+            raise ValueError('export paths must be inside the output_dir')
+        _, manager = self.getManager(file_name, options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return manager.export(path, file_format=file_format)
+
+    @staticmethod
+    def __removeStaleSocket(address):
+        """ Removes a socket left at address by a worker that is gone. Anything else there is an error. """
+        if not os.path.lexists(address):
+            return
+        if not stat.S_ISSOCK(os.lstat(address).st_mode): raise FileExistsError(address)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(address)
+        except ConnectionRefusedError:
+            os.remove(address)
+            return
+        finally:
+            probe.close()
+        raise FileExistsError(address + ' is in use by a running worker')
+
+    def __getStatus(self):
+        return [{'file_name': file_name, 'options': json.loads(options), 'version': manager.version,
+                 'backend': manager.backend}
+                for (file_name, options), manager in self.managers.items()]
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    # Idle client connections must not keep the worker from shutting down
+    daemon_threads = True
+    block_on_close = False
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    block_on_close = False
+
+
+class GraphWorkerClient:
+    def __init__(self, address=default_address, timeout=None):
+        """ A connection to the GraphWorker at address, reused for every request """
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.file = self.socket.makefile('rwb')
+
+    ##################
+    # Public Methods #
+    ##################
+    def request(self, command, **arguments):
+        """ The result of the command, or a RuntimeError with the worker's error """
+        arguments['command'] = command
+        self.file.write((json.dumps(arguments) + '\n').encode())
+        self.file.flush()
+        line = self.file.readline()
+        if len(line) == 0: raise ConnectionError('the worker closed the connection')
+        reply = json.loads(line)
+        if not reply['ok']: raise RuntimeError(reply['error'])
+        return reply['result']
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+def _toJson(value):
+    """ numpy values, tuples and sets in results """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (np.ndarray, set, frozenset)):
+        return list(value)
+    raise TypeError(type(value).__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep graphs warm and answer build and analysis requests')
+    parser.add_argument('--unix', default=default_address, help='unix socket path (default %(default)s)')
+    parser.add_argument('--port', type=int, help='listen on this localhost port instead of a unix socket')
+    parser.add_argument('--host', default='127.0.0.1', help='host of the port')
+    parser.add_argument('--max-managers', type=int, default=4)
+    parser.add_argument('--output-dir', help='directory export requests write into (no exports without it)')
+    parser.add_argument('--data-dir', default='.', help='directory the csv files are read from')
+    parser.add_argument('--cache-dir', help='directory of the graph caches (no caches without it)')
+    arguments = parser.parse_args()
+    address = arguments.unix if arguments.port is None else (arguments.host, arguments.port)
+    worker = GraphWorker(address, arguments.max_managers, arguments.output_dir, arguments.data_dir,
+                         arguments.cache_dir)
+    print("graph worker listening on", worker.address, flush=True)
+    worker.serve()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+""" The modules a headless job imports, their import time budget, and how the
+    import is timed. Only the standard library is used here, so that
+    Benchmark.py and test_imports.py can share these without importing the
+    rest of the series.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import os
+import subprocess
+import sys
+
+# Modules a headless job imports, and their import time budget in seconds (about 0.7 s when measured)
+headless_modules = ('GraphDatabaseManager', 'GraphDatabaseManager_v2', 'GraphAnalytics')
+import_time_budget = 1.0
+
+
+def getImportTime(modules, repeats=3):
+    """ Best time to import modules in a fresh interpreter, and the plotting modules it loaded """
+    script = ("import sys, time\nstart = time.perf_counter()\nimport " + ", ".join(modules) +
+              "\nprint(time.perf_counter() - start)\n"
+              "print(' '.join(sorted({name.split('.')[0] for name in sys.modules} & {'matplotlib', 'pygraphviz'})))")
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        lines = output.stdout.split('\n')
+        best = float(lines[0]) if best is None else min(best, float(lines[0]))
+    return best, lines[1].split()
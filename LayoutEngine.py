@@ -0,0 +1,184 @@
+""" Built-in graph layout for graphs too large for graphviz neato.
+    The layout starts from a sparse spectral embedding (the second and third
+    eigenvectors of the normalized adjacency, found with Lanczos iterations)
+    and is refined by Fruchterman-Reingold forces computed with NumPy.
+
+    Attraction is summed over the edge arrays. Repulsion uses a Barnes-Hut
+    style approximation on a grid: nodes are repelled by the mass of every
+    other grid cell (one FFT convolution of the cell masses with the force
+    kernel) and exactly by the other nodes in their own cell, so one iteration
+    costs about O(n + cells log cells) instead of O(n^2).
+
+    A layout can be warm-started from earlier positions (for example the
+    cached positions of the graph before an incremental update), in which case
+    only a short, cooler refinement is run.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import networkx as nx
+import numpy as np
+from scipy import sparse
+from scipy import signal
+from scipy.sparse import linalg
+
+
+class LayoutEngine:
+    def __init__(self, iterations=50, refine_iterations=15, grid_size=128, near_samples=32, seed=1):
+        """ iterations is the budget for a cold layout, refine_iterations for a warm start.
+            grid_size is the number of cells along each axis used to approximate repulsion, and
+            near_samples bounds how many cell mates each node is repelled by exactly.
+        """
+        self.iterations = iterations
+        self.refine_iterations = refine_iterations
+        self.grid_size = grid_size
+        self.near_samples = near_samples
+        self.seed = seed
+
+    ##################
+    # Public Methods #
+    ##################
+    def getLayout(self, G, initial_pos=None, iterations=None):
+        """ Returns a dictionary from node to (x, y), centred on the origin and scaled to [-1, 1].
+            initial_pos warm-starts the layout; nodes missing from it are placed next to their neighbours.
+        """
+        nodelist = list(G.nodes())
+        if len(nodelist) == 0:
+            return dict()
+        A = nx.to_scipy_sparse_array(G, nodelist=nodelist, weight='weight', format='csr', dtype=np.float64)
+        A = sparse.csr_matrix(A + A.T)  # forces act the same way along both directions of an edge
+        if initial_pos is not None and any(node in initial_pos for node in nodelist):
+            positions = self.__getWarmStart(A, nodelist, initial_pos)
+            temperature = 0.02
+            if iterations is None:
+                iterations = self.refine_iterations
+        else:
+            positions = self.__getSpectralLayout(A)
+            temperature = 0.1
+            if iterations is None:
+                iterations = self.iterations
+        positions = self.__refine(A, positions, iterations, temperature)
+        positions = self.__rescale(positions)
+        return {node: (float(x), float(y)) for node, (x, y) in zip(nodelist, positions)}
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getSpectralLayout(self, A):
+        num_nodes = A.shape[0]
+        random_state = np.random.default_rng(self.seed)
+        if num_nodes < 4:
+            return random_state.random((num_nodes, 2))
+        degree = np.asarray(A.sum(axis=1)).ravel()
+        scale = 1 / np.sqrt(np.where(degree > 0, degree, 1))
+        # The largest eigenvectors of I + D^-1/2 A D^-1/2 are the smallest of the normalized Laplacian
+        M = sparse.identity(num_nodes) + sparse.diags(scale) @ A @ sparse.diags(scale)
+        try:
+            values, vectors = linalg.eigsh(M, k=3, which='LA', v0=random_state.random(num_nodes),
+                                           maxiter=num_nodes * 10, tol=1e-4)
+            positions = vectors[:, np.argsort(values)[::-1][1:3]]
+        except (linalg.ArpackNoConvergence, linalg.ArpackError):
+            positions = random_state.random((num_nodes, 2))
+        # Nodes that share a spectral position would never separate, so jitter them slightly
+        positions = self.__rescale(positions) + random_state.normal(0, 1e-3, positions.shape)
+        return positions
+
+    def __getWarmStart(self, A, nodelist, initial_pos):
+        num_nodes = len(nodelist)
+        known = np.array([node in initial_pos for node in nodelist])
+        positions = np.zeros((num_nodes, 2))
+        positions[known] = [initial_pos[node] for node, is_known in zip(nodelist, known) if is_known]
+        positions[known] = self.__rescale(positions[known])
+        # New nodes start at the mean of their placed neighbours, or at a random spot
+        random_state = np.random.default_rng(self.seed)
+        placed = sparse.diags(known.astype(np.float64))
+        neighbour_sum = (A @ placed) @ positions
+        neighbour_count = np.asarray((A @ placed).sum(axis=1)).ravel()
+        unknown = ~known
+        has_neighbours = unknown & (neighbour_count > 0)
+        positions[has_neighbours] = neighbour_sum[has_neighbours] / neighbour_count[has_neighbours, None]
+        isolated = unknown & (neighbour_count == 0)
+        positions[isolated] = random_state.uniform(-1, 1, (isolated.sum(), 2))
+        positions[unknown] += random_state.normal(0, 1e-2, (unknown.sum(), 2))
+        return positions
+
+    def __refine(self, A, positions, iterations, temperature):
+        num_nodes = positions.shape[0]
+        if num_nodes < 2 or iterations == 0:
+            return positions
+        A = sparse.coo_matrix(sparse.triu(A, k=1))
+        sources, targets = A.row, A.col
+        weights = A.data / A.data.max() if A.nnz > 0 else A.data
+        k = np.sqrt(4.0 / num_nodes)  # ideal edge length for an area of 2 x 2
+        cooling = temperature / (iterations + 1)
+        for _ in range(iterations):
+            displacement = self.__getRepulsion(positions, k)
+            # Attraction along the edges, d^2 / k scaled by the relative edge weight
+            delta = positions[sources] - positions[targets]
+            distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+            force = (delta * (distance * weights / k)[:, None])
+            for axis in range(2):
+                displacement[:, axis] -= np.bincount(sources, force[:, axis], minlength=num_nodes)
+                displacement[:, axis] += np.bincount(targets, force[:, axis], minlength=num_nodes)
+            # Move every node at most temperature along its displacement
+            length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+            positions = positions + displacement * (np.minimum(length, temperature) / length)[:, None]
+            temperature -= cooling
+        return positions
+
+    def __getRepulsion(self, positions, k):
+        """ k^2 / d repulsion. Nodes in other cells act through the cell masses, convolved with the
+            force kernel by FFT; nodes in the same cell act on each other exactly.
+        """
+        num_nodes = positions.shape[0]
+        grid_size = max(1, min(self.grid_size, int(np.sqrt(num_nodes))))
+        low = positions.min(axis=0)
+        cell_size = np.maximum(positions.max(axis=0) - low, 1e-9) / grid_size
+        cell_xy = np.minimum(((positions - low) / cell_size).astype(np.int64), grid_size - 1)
+        cell = cell_xy[:, 0] * grid_size + cell_xy[:, 1]
+        mass = np.bincount(cell, minlength=grid_size * grid_size).astype(np.float64).reshape(grid_size, grid_size)
+
+        # Far field: force on cell a is the sum over cells b of mass[b] k^2 (a - b) / |a - b|^2
+        offsets = np.arange(-(grid_size - 1), grid_size)
+        dx = offsets[:, None] * cell_size[0] + np.zeros((1, len(offsets)))
+        dy = offsets[None, :] * cell_size[1] + np.zeros((len(offsets), 1))
+        distance_squared = dx ** 2 + dy ** 2
+        distance_squared[grid_size - 1, grid_size - 1] = np.inf  # the own cell is done exactly below
+        displacement = np.zeros_like(positions)
+        for axis, kernel in enumerate((dx, dy)):
+            field = signal.fftconvolve(mass, k * k * kernel / distance_squared, mode='full')
+            field = field[grid_size - 1:2 * grid_size - 1, grid_size - 1:2 * grid_size - 1]
+            displacement[:, axis] = field[cell_xy[:, 0], cell_xy[:, 1]]
+
+        # Near field: with the nodes sorted by cell (and shuffled within it) every pair in a cell is
+        # some offset apart. Cells with more than near_samples other nodes are sampled, and the
+        # sampled force is scaled up to the size of the cell.
+        random_state = np.random.default_rng(self.seed)
+        order = np.lexsort((random_state.permutation(num_nodes), cell))
+        sorted_cell = cell[order]
+        near = np.zeros_like(positions)
+        pairs = np.zeros(num_nodes)
+        for offset in range(1, min(int(mass.max()), self.near_samples + 1)):
+            same_cell = sorted_cell[offset:] == sorted_cell[:-offset]
+            first = order[:-offset][same_cell]
+            second = order[offset:][same_cell]
+            delta = positions[first] - positions[second]
+            force = delta * (k * k / np.maximum((delta ** 2).sum(axis=1), 1e-12))[:, None]
+            for axis in range(2):
+                near[:, axis] += np.bincount(first, force[:, axis], minlength=num_nodes)
+                near[:, axis] -= np.bincount(second, force[:, axis], minlength=num_nodes)
+            pairs += np.bincount(first, minlength=num_nodes) + np.bincount(second, minlength=num_nodes)
+        others = mass.ravel()[cell] - 1
+        sampled = pairs > 0
+        displacement[sampled] += near[sampled] * (others[sampled] / pairs[sampled])[:, None]
+        return displacement
+
+    @staticmethod
+    def __rescale(positions):
+        positions = positions - positions.mean(axis=0)
+        extent = np.abs(positions).max()
+        if extent > 0:
+            positions = positions / extent
+        return positions
@@ -0,0 +1,150 @@
+""" Per-stage timing, peak memory and hot-path profiles of a pipeline run.
+    Every stage runs inside profiler.stage(name): the wall time is always
+    recorded, the peak traced memory (tracemalloc, which also sees the numpy
+    and pandas buffers) unless trace_memory is off, and with profile_dir set a
+    cProfile dump of the stage is written there (name.prof, loadable with
+    pstats or snakeviz, plus name.txt with the functions by cumulative time).
+
+    Tracing memory slows pure Python code down, so timings are only
+    comparable between runs made with the same trace_memory setting; the
+    setting is stored with the results.
+
+    Stages can be nested (a GraphManager built with the profiler inside an
+    outer stage records its own build stages). Tracing runs from the start
+    of the outermost stage to its end, and the peak of every stage covers
+    its own block, inner stages included, above the memory already traced
+    when the stage started. cProfile cannot run twice at once,
+    so only the outermost stage is profiled.
+
+    The results are written as JSON, and compare prints the change of every
+    stage against the results of an earlier run.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import platform
+import pstats
+import resource
+import time
+import tracemalloc
+
+
+class PipelineProfiler:
+    def __init__(self, trace_memory=True, profile_dir=None, verbose=True):
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.verbose = verbose
+        # One dictionary per stage in run order, and free form information about the run
+        self.stages = []
+        self.info = dict()
+        # Traced memory at the start and peak traced memory of every open stage, outermost first
+        self.__open_starts = []
+        self.__open_peaks = []
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    ##################
+    # Public Methods #
+    ##################
+    @contextmanager
+    def stage(self, name):
+        """ Measures the code run inside the with block as the stage name """
+        outermost = len(self.__open_peaks) == 0
+        profile = cProfile.Profile() if self.profile_dir is not None and outermost else None
+        if self.trace_memory:
+            if outermost:
+                tracemalloc.start()
+            else:
+                # The peak so far belongs to the enclosing stages, and tracing restarts its peak here
+                self.__updateOpenPeaks()
+                tracemalloc.reset_peak()
+        self.__open_starts.append(tracemalloc.get_traced_memory()[0] if self.trace_memory else 0)
+        self.__open_peaks.append(0)
+        if profile is not None:
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            result = {'name': name, 'seconds': seconds}
+            if self.trace_memory:
+                self.__updateOpenPeaks()
+                result['peak_mb'] = (self.__open_peaks[-1] - self.__open_starts[-1]) / 2 ** 20
+            self.__open_starts.pop()
+            self.__open_peaks.pop()
+            if self.trace_memory and outermost:
+                tracemalloc.stop()
+            # Peak resident set size of the process so far (it never decreases)
+            result['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            if profile is not None:
+                result['profile'] = self.__dumpProfile(profile, name)
+            self.stages.append(result)
+            if self.verbose:
+                self.__printStage(result)
+
+    def getResults(self):
+        return {'python': platform.python_version(), 'machine': platform.machine(),
+                'trace_memory': self.trace_memory, 'profiled': self.profile_dir is not None,
+                'info': self.info, 'stages': self.stages}
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as output:
+            json.dump(self.getResults(), output, indent=2)
+        return path
+
+    def compare(self, path):
+        """ Prints every stage against the stage of the same name in the results written to path.
+            If path holds a list of results, the one with the same info['scale'] is used.
+        """
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+        if isinstance(previous, list):
+            matches = [results for results in previous if results['info'].get('scale') == self.info.get('scale')]
+            if len(matches) == 0: raise ValueError
+            previous = matches[0]
+        print("Compared with", path)
+        if previous['trace_memory'] != self.trace_memory or previous.get('profiled') != (self.profile_dir is not None):
+            print("   (the runs differ in memory tracing or profiling, so the timings are not comparable)")
+        previous = {stage['name']: stage for stage in previous['stages']}
+        for stage in self.stages:
+            before = previous.get(stage['name'])
+            if before is None:
+                print("   {:18s} new stage".format(stage['name'] + ':'))
+                continue
+            line = "   {:18s} {:8.3f} s -> {:8.3f} s ({:+.0%})".format(
+                stage['name'] + ':', before['seconds'], stage['seconds'],
+                stage['seconds'] / before['seconds'] - 1 if before['seconds'] > 0 else 0)
+            if 'peak_mb' in stage and 'peak_mb' in before:
+                line += "   {:8.1f} MB -> {:8.1f} MB".format(before['peak_mb'], stage['peak_mb'])
+            print(line)
+
+    ###################
+    # Private Methods #
+    ###################
+    def __updateOpenPeaks(self):
+        """ Raises the peak of every open stage to the traced peak since the last reset """
+        peak = tracemalloc.get_traced_memory()[1]
+        self.__open_peaks = [max(open_peak, peak) for open_peak in self.__open_peaks]
+
+    def __dumpProfile(self, profile, name):
+        base = os.path.join(self.profile_dir, name.replace(' ', '_').replace('/', '_'))
+        profile.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w', encoding='utf-8') as output:
+            pstats.Stats(profile, stream=output).sort_stats('cumulative').print_stats(40)
+        return base + '.prof'
+
+    @staticmethod
+    def __printStage(result):
+        line = "   {:18s} {:8.3f} s".format(result['name'] + ':', result['seconds'])
+        if 'peak_mb' in result:
+            line += "   {:8.1f} MB peak".format(result['peak_mb'])
+        print(line)
@@ -0,0 +1,192 @@
+""" Declarative row preprocessing: derived columns, filters and bins.
+    A pipeline is described by three plain structures, applied in this order:
+      per_capita  new column -> (numerator, denominator, scale), e.g.
+                  {'suicides_per_100k': ('suicides_no', 'population', 100000)}
+      filters     list of {'column': c} dictionaries with 'include' or
+                  'exclude' (lists of values) and/or 'min' / 'max' (inclusive)
+                  and 'above' / 'below' (exclusive)
+      bins        column -> {'edges': [...]} for fixed edges, or
+                  {'quantiles': q} (q equal-count bins, or a list of
+                  quantiles from 0 to 1), optionally with 'labels', the
+                  output 'name' (default column + '_bins') and 'right'
+    Every stage is one vectorized pass: the filters are combined into a
+    single row mask, and values are binned with one searchsorted over the
+    edges. Bins are closed on the right and the first bin includes its lower
+    edge, like pd.cut(include_lowest=True); with 'right': False they are
+    closed on the left and the last bin includes its upper edge. Labels
+    default to 'low-high'.
+
+    Quantile edges depend on the rows, so fit computes them once and returns
+    a pipeline with fixed edges, which gives the same bins to rows added
+    later. Results are cached by the pipeline and a key of the input rows
+    given by the caller, like the content hash of the csv they were read
+    from (so a hit skips reading the file as well), and the same
+    preprocessing of the same rows is only computed once. Rows without a key
+    are not cached: hashing them costs more than preprocessing them.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from collections import OrderedDict
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# (pipeline key, rows key) -> (fitted pipeline, preprocessed rows), least recently used first
+_result_cache = OrderedDict()
+cache_size = 8
+
+
+class PreprocessingPipeline:
+    def __init__(self, filters=None, bins=None, per_capita=None):
+        self.filters = [dict(rule) for rule in (filters or [])]
+        self.bins = {column: dict(spec) for column, spec in (bins or dict()).items()}
+        self.per_capita = {column: tuple(spec) for column, spec in (per_capita or dict()).items()}
+        for rule in self.filters:
+            if 'column' not in rule or \
+                    not set(rule) - {'column'} <= {'include', 'exclude', 'min', 'max', 'above', 'below'}:
+                raise ValueError
+        for spec in self.bins.values():
+            if ('edges' in spec) == ('quantiles' in spec): raise ValueError
+        self.key = hashlib.sha256(json.dumps({'filters': self.filters, 'bins': self.bins,
+                                              'per_capita': self.per_capita},
+                                             sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    ##################
+    # Public Methods #
+    ##################
+    def isFixed(self):
+        """ True if no bin edges depend on the rows """
+        return all('edges' in spec for spec in self.bins.values())
+
+    def fit(self, dataframe):
+        """ The same pipeline with the quantile bins replaced by the edges they have on the rows of dataframe """
+        if self.isFixed():
+            return self
+        rows = self.__filter(self.__derive(dataframe))
+        bins = dict()
+        for column, spec in self.bins.items():
+            if column not in rows.columns: raise ValueError
+            spec = dict(spec)
+            if 'quantiles' in spec:
+                quantiles = spec.pop('quantiles')
+                if np.isscalar(quantiles):
+                    quantiles = np.linspace(0, 1, int(quantiles) + 1)
+                values = pd.to_numeric(rows[column]).to_numpy(dtype=np.float64)
+                spec['edges'] = np.unique(np.nanquantile(values, quantiles)).tolist()
+                if 'labels' not in spec:
+                    spec['labels'] = ['{:g}-{:g}'.format(low, high)
+                                      for low, high in zip(spec['edges'][:-1], spec['edges'][1:])]
+            bins[column] = spec
+        return PreprocessingPipeline(self.filters, bins, self.per_capita)
+
+    def apply(self, dataframe, rows_key=None):
+        """ The preprocessed rows of dataframe (which is left unchanged) """
+        return self.run(dataframe, rows_key)[1]
+
+    def run(self, dataframe, rows_key=None):
+        """ The fitted pipeline and the preprocessed rows of dataframe.
+            With rows_key, a key that identifies the rows, the result is cached.
+        """
+        if rows_key is None:
+            fitted = self.fit(dataframe)
+            return fitted, fitted.__apply(dataframe)
+        result = self.getCached(rows_key)
+        if result is None:
+            fitted = self.fit(dataframe)
+            _result_cache[(self.key, rows_key)] = (fitted, fitted.__apply(dataframe))
+            while len(_result_cache) > cache_size:
+                _result_cache.popitem(last=False)
+            result = self.getCached(rows_key)
+        return result
+
+    def getCached(self, rows_key):
+        """ The fitted pipeline and the preprocessed rows cached for rows_key, or None """
+        key = (self.key, rows_key)
+        if key not in _result_cache:
+            return None
+        _result_cache.move_to_end(key)
+        fitted, rows = _result_cache[key]
+        # A shallow copy, so columns added by the caller never reach the cached rows
+        return fitted, rows.copy(deep=False)
+
+    @staticmethod
+    def getBinLabels(edges):
+        return [str(low) + '-' + str(high) for low, high in zip(edges[:-1], edges[1:])]
+
+    @staticmethod
+    def binValues(values, edges, labels=None, right=True):
+        """ Ordered Categorical of the bin of every value, like pd.cut(values, edges, include_lowest=True).
+            With right=False bins hold their lower edge instead, and the last bin its upper edge.
+            Values outside the edges, and missing values, get no bin.
+        """
+        if labels is None:
+            labels = PreprocessingPipeline.getBinLabels(edges)
+        edges = np.asarray(edges, dtype=np.float64)
+        if len(labels) != len(edges) - 1 or (np.diff(edges) <= 0).any(): raise ValueError
+        values = pd.to_numeric(pd.Series(values)).to_numpy(dtype=np.float64)
+        if right:
+            # Bin i holds edges[i] < value <= edges[i + 1]
+            codes = np.searchsorted(edges, values, side='left') - 1
+            codes[values == edges[0]] = 0
+        else:
+            # Bin i holds edges[i] <= value < edges[i + 1]
+            codes = np.searchsorted(edges, values, side='right') - 1
+            codes[values == edges[-1]] = len(labels) - 1
+        codes[(codes >= len(labels)) | np.isnan(values)] = -1
+        return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+    @staticmethod
+    def clearCache():
+        _result_cache.clear()
+
+    ###################
+    # Private Methods #
+    ###################
+    def __apply(self, dataframe):
+        """ Runs the stages of a fitted pipeline """
+        dataframe = self.__filter(self.__derive(dataframe))
+        for column, spec in self.bins.items():
+            if column not in dataframe.columns: raise ValueError
+            dataframe[spec.get('name', column + '_bins')] = self.binValues(
+                dataframe[column], spec['edges'], spec.get('labels'), spec.get('right', True))
+        return dataframe
+
+    def __derive(self, dataframe):
+        if len(self.per_capita) == 0:
+            return dataframe
+        columns = dict()
+        for column, (numerator, denominator, scale) in self.per_capita.items():
+            columns[column] = dataframe[numerator].to_numpy(dtype=np.float64) / \
+                dataframe[denominator].to_numpy(dtype=np.float64) * scale
+        return dataframe.assign(**columns)
+
+    def __filter(self, dataframe):
+        """ The rows that pass every filter, selected with one combined mask """
+        mask = np.ones(len(dataframe), dtype=bool)
+        for rule in self.filters:
+            if rule['column'] not in dataframe.columns: raise ValueError
+            column = dataframe[rule['column']]
+            if 'include' in rule:
+                mask &= column.isin(rule['include']).to_numpy()
+            if 'exclude' in rule:
+                mask &= ~column.isin(rule['exclude']).to_numpy()
+            if 'min' in rule:
+                mask &= (column >= rule['min']).to_numpy()
+            if 'max' in rule:
+                mask &= (column <= rule['max']).to_numpy()
+            if 'above' in rule:
+                mask &= (column > rule['above']).to_numpy()
+            if 'below' in rule:
+                mask &= (column < rule['below']).to_numpy()
+        dataframe = dataframe[mask] if not mask.all() else dataframe.copy(deep=False)
+        for rule in self.filters:
+            # Values filtered away should not show up as empty categories
+            column = dataframe[rule['column']]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                dataframe[rule['column']] = column.cat.remove_unused_categories()
+        return dataframe
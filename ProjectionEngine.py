@@ -0,0 +1,214 @@
+""" Sparse-matrix projection engine.
+    Computes the two-step projection of a graph onto a set of nodes as a
+    sparse matrix product instead of running all pairs shortest paths.
+
+    If A is the adjacency matrix of the graph and S is the set of nodes we
+    project onto, then the projection is P = A[S,:] @ A[:,S]. For an undirected
+    graph A[:,S] is just A[S,:].T, so this is the B @ B.T of the biadjacency B
+    between S and its neighbours. Entry P[i,j] counts the two-step paths from
+    i to j. Pairs that are directly connected are removed so that the result
+    matches the "shortest path of length exactly two" rule used before.
+
+    With hub nodes the projection is nearly complete, so it can be pruned as it
+    is generated: P is computed in blocks of rows holding at most about
+    block_entries two-step paths (so the memory of a block is bounded whatever
+    the degrees), and each block is cut
+    down to the entries with at least min_weight, the top_k entries of each
+    row, and/or the entries that pass the disparity filter backbone test
+    (Serrano, Boguna and Vespignani, 2009) before the next block is computed.
+    In an undirected projection an edge is kept when either end keeps it.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from CompactGraph import CompactGraph
+
+
+class ProjectionEngine:
+    # How the weights of the two edges on a path u - w - v are combined.
+    # The projected weight is the sum of the path values over all intermediate nodes w.
+    path_weights = {None, 'count', 'product', 'sum', 'min'}
+
+    def __init__(self, G):
+        """ G is a networkx graph or a CompactGraph """
+        self.G = G
+
+    ##################
+    # Public Methods #
+    ##################
+    def project(self, node_set, weight=None, min_weight=None, top_k=None, alpha=None, block_entries=1 << 22):
+        """ Returns (P, node_list) where P is a CSR matrix indexed by node_list.
+            weight=None or 'count' counts the two-step paths (the shared neighbours),
+            'product' sums weight(u,w) * weight(w,v),
+            'sum' sums weight(u,w) + weight(w,v),
+            'min' sums min(weight(u,w), weight(w,v)).
+            Pruning, applied to the projected values: min_weight keeps entries >= min_weight,
+            top_k keeps the top_k largest entries of every row, and alpha keeps entries whose
+            disparity filter p-value is below alpha. Entries must pass all the given tests.
+        """
+        if weight not in self.path_weights: raise ValueError
+        if top_k is not None and top_k < 1: raise ValueError
+        node_list = [node for node in node_set if node in self.G]
+        left, right, direct = self.__getBiadjacency(node_list, weight is not None and weight != 'count')
+        if weight == 'sum':
+            left_ones = self.__getPattern(left)
+            right_ones = self.__getPattern(right)
+        blocks = []
+        for start, end in self.__getBlocks(left, right, block_entries):
+            rows = slice(start, end)
+            if weight is None or weight == 'count' or weight == 'product':
+                block = left[rows] @ right
+            elif weight == 'sum':
+                block = left[rows] @ right_ones + left_ones[rows] @ right
+            else:
+                block = self.__minPathProduct(left[rows], right)
+            block = sparse.coo_matrix(block)
+            # Only keep pairs whose shortest path has length exactly two
+            keep = block.col != block.row + start
+            keep &= np.asarray(direct[rows][block.row, block.col]).ravel() == 0
+            keep &= block.data != 0
+            keep[keep] = self.__pruneRows(block.row[keep], block.data[keep], block.shape[0],
+                                          min_weight, top_k, alpha)
+            blocks += [sparse.coo_matrix((block.data[keep], (block.row[keep], block.col[keep])),
+                                         shape=block.shape)]
+        P = sparse.csr_matrix(sparse.vstack(blocks)) if len(blocks) > 0 else \
+            sparse.csr_matrix((len(node_list), len(node_list)))
+        if not self.G.is_directed() and (top_k is not None or alpha is not None):
+            # Keep an edge that either of its ends keeps
+            P = sparse.csr_matrix(P.maximum(P.T))
+        return P, node_list
+
+    def projectToGraph(self, node_set, weight=None, min_weight=None, top_k=None, alpha=None):
+        """ Same as project, but returns a networkx graph.
+            The projected value is stored in the 'weight' edge attribute when weight is not None.
+        """
+        P, node_list = self.project(node_set, weight, min_weight, top_k, alpha)
+        return self.matrixToGraph(P, node_list, weight is not None)
+
+    def matrixToGraph(self, P, node_list, weighted=True):
+        if self.G.is_directed():
+            H = nx.empty_graph(create_using=nx.DiGraph)
+        else:
+            H = nx.empty_graph()
+        P = P.tocoo()
+        sources = [node_list[i] for i in P.row]
+        targets = [node_list[j] for j in P.col]
+        if weighted:
+            H.add_weighted_edges_from(zip(sources, targets, P.data.tolist()))
+        else:
+            H.add_edges_from(zip(sources, targets))
+        return H
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getBiadjacency(self, node_list, weighted):
+        """ Returns A[S,:], A[:,S] and A[S,S] with the columns restricted to nodes that have an edge """
+        all_nodes = list(self.G.nodes())
+        if isinstance(self.G, CompactGraph):
+            A = self.G.getAdjacency(weighted)
+        else:
+            A = nx.to_scipy_sparse_array(self.G, nodelist=all_nodes, weight='weight' if weighted else None,
+                                         dtype=np.float64, format='csr')
+        index = {node: i for i, node in enumerate(all_nodes)}
+        rows = np.array([index[node] for node in node_list], dtype=np.int64)
+        left = sparse.csr_matrix(A[rows, :])
+        right = sparse.csr_matrix(A[:, rows])
+        direct = left[:, rows]
+        # Drop intermediate nodes that are not neighbours of the node set
+        neighbours = np.flatnonzero(left.getnnz(axis=0) + right.getnnz(axis=1))
+        return left[:, neighbours], right[neighbours, :], direct
+
+    def __getBlocks(self, left, right, block_entries):
+        """ (start, end) row ranges whose two-step path counts add up to about block_entries """
+        # The paths of a row bound the entries it gets in P
+        paths = self.__getPattern(left) @ right.getnnz(axis=1).astype(np.float64)
+        block_ids = (np.cumsum(paths) - paths) // max(block_entries, 1)
+        boundaries = np.flatnonzero(np.diff(block_ids)) + 1
+        starts = np.concatenate([[0], boundaries]).astype(np.int64)
+        ends = np.concatenate([boundaries, [left.shape[0]]]).astype(np.int64)
+        return [(start, end) for start, end in zip(starts, ends) if end > start]
+
+    @staticmethod
+    def __pruneRows(rows, values, num_rows, min_weight, top_k, alpha):
+        """ Which entries of a block (given by row, in increasing order, and value) pass the pruning tests """
+        keep = np.ones(len(values), dtype=bool)
+        if min_weight is not None:
+            keep &= values >= min_weight
+        if alpha is not None:
+            # Disparity filter: the chance that a node with this strength and degree, spreading its
+            # strength uniformly at random, gives one of its edges at least this much is
+            # (1 - w / s)^(k - 1). It is below alpha when w > s (1 - alpha^(1 / (k - 1))), a threshold per row
+            strength = np.bincount(rows, values, minlength=num_rows)
+            degree = np.bincount(rows, minlength=num_rows)
+            threshold = strength * (1 - alpha ** (1 / np.maximum(degree - 1, 1)))
+            threshold[degree == 1] = -np.inf
+            keep &= values > threshold[rows]
+        if top_k is not None:
+            keep &= ProjectionEngine.__getTopEntries(rows, values, num_rows, top_k)
+        return keep
+
+    @staticmethod
+    def __getTopEntries(rows, values, num_rows, top_k, long_row=4096):
+        """ Which entries are among the top_k largest of their row. The entries of a row are contiguous
+            because rows is in increasing order. Rows with more than top_k entries are padded into
+            matrices of rows of similar length (within a factor of 2, so padding at most doubles them)
+            and cut with one argpartition per matrix. Rows of long_row entries or more are cut in place
+            instead: there are at most len(values) / long_row of them, so the per-row call costs little
+            next to the partition itself, and no matrix has to be built.
+        """
+        counts = np.bincount(rows, minlength=num_rows)
+        in_top = (counts <= top_k)[rows]
+        row_starts = np.cumsum(counts) - counts
+        for row in np.flatnonzero(counts >= max(long_row, top_k + 1)):
+            start = row_starts[row]
+            in_top[start + np.argpartition(-values[start:start + counts[row]], top_k - 1)[:top_k]] = True
+        short_rows = np.flatnonzero((counts > top_k) & (counts < long_row))
+        lengths = np.ceil(np.log2(counts[short_rows])).astype(np.int64)
+        for length in np.unique(lengths):
+            group_rows = short_rows[lengths == length]
+            group_counts = counts[group_rows]
+            group_starts = np.cumsum(group_counts) - group_counts
+            width = group_counts.max()
+            # Entry i of the group goes to row slot and column i - group start of its row, and the
+            # values are negated and padded with +inf, so the top_k largest are the top_k smallest
+            columns = np.arange(group_counts.sum()) - np.repeat(group_starts, group_counts)
+            slots = np.repeat(np.arange(len(group_rows)), group_counts)
+            entries = np.repeat(row_starts[group_rows], group_counts) + columns
+            matrix = np.full((len(group_rows), width), np.inf)
+            matrix[slots, columns] = -values[entries]
+            top = np.argpartition(matrix, top_k - 1, axis=1)[:, :top_k]
+            in_top[(row_starts[group_rows][:, None] + top).ravel()] = True
+        return in_top
+
+    @staticmethod
+    def __getPattern(M):
+        pattern = sparse.csr_matrix(M, copy=True)
+        pattern.data = np.ones_like(pattern.data)
+        return pattern
+
+    @staticmethod
+    def __minPathProduct(left, right):
+        """ Sums min(left[i,k], right[k,j]) over the intermediate nodes k """
+        left = sparse.csc_matrix(left)
+        right = sparse.csr_matrix(right)
+        rows, cols, values = [], [], []
+        for k in range(left.shape[1]):
+            i = left.indices[left.indptr[k]:left.indptr[k + 1]]
+            a = left.data[left.indptr[k]:left.indptr[k + 1]]
+            j = right.indices[right.indptr[k]:right.indptr[k + 1]]
+            b = right.data[right.indptr[k]:right.indptr[k + 1]]
+            rows += [np.repeat(i, len(j))]
+            cols += [np.tile(j, len(i))]
+            values += [np.minimum.outer(a, b).ravel()]
+        shape = (left.shape[0], right.shape[1])
+        if len(rows) == 0:
+            return sparse.csr_matrix(shape)
+        return sparse.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                 shape=shape).tocsr()
@@ -0,0 +1,207 @@
+""" Indexed queries over a built graph.
+    All indexes are built once from the CompactGraph arrays:
+      - an inverted index from every category value to the ids of the
+        composite nodes that contain it (the category values of every node
+        come from the rows, see GraphManager.getQueryEngine, since a value
+        like 'Korea, Republic of' cannot be split back out of a node name),
+      - the edges of every node sorted by decreasing weight, so a weight
+        threshold or a top-k is a binary search and a slice,
+      - the weighted degree of every node, and the nodes of every node type
+        ranked by it.
+    A query then only touches the nodes and edges it returns.
+
+    Node types are named like in nodes_by_attribute_dict ('country, age, sex').
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import numpy as np
+
+
+class QueryEngine:
+    def __init__(self, core, node_types, nodes_by_attribute_dict, node_values=None):
+        """ core is a CompactGraph, node_types the category lists the graph was built from.
+            node_values maps every node type to a dictionary from node name to its category values.
+            Without it the values are split from the names, and a name that does not split into
+            one value per category raises a ValueError.
+        """
+        self.core = core
+        num_nodes = core.number_of_nodes()
+        self.labels = core.labels
+        self.__ids = dict(zip(self.labels.tolist(), range(num_nodes)))
+        self.degrees = core.getDegrees()
+        self.weighted_degrees = core.getDegrees(weighted=True)
+
+        # Edges of every node by decreasing weight (the rows keep their CSR extents)
+        rows = np.repeat(np.arange(num_nodes), self.degrees)
+        order = np.lexsort((-core.weights, rows))
+        self.indptr = core.indptr
+        self.neighbors = core.indices[order]
+        self.neighbor_weights = core.weights[order]
+
+        self.type_masks = dict()
+        self.type_rankings = dict()
+        # category -> value -> sorted node ids
+        self.value_index = dict()
+        for categories in node_types:
+            node_type = ', '.join(categories)
+            node_ids = np.sort(core.getIds(list(nodes_by_attribute_dict.get(node_type, ()))))
+            node_ids = node_ids[node_ids >= 0]
+            mask = np.zeros(num_nodes, dtype=bool)
+            mask[node_ids] = True
+            self.type_masks[node_type] = mask
+            self.type_rankings[node_type] = node_ids[np.argsort(-self.weighted_degrees[node_ids], kind='stable')]
+            type_values = (node_values or dict()).get(node_type, dict())
+            components = [self.__getComponents(label, type_values, categories)
+                          for label in self.labels[node_ids].tolist()]
+            for position, category in enumerate(categories):
+                values = np.array([parts[position] for parts in components], dtype=object)
+                category_index = self.value_index.setdefault(category, dict())
+                for value, ids in self.__groupIds(values, node_ids).items():
+                    if value in category_index:
+                        ids = np.union1d(category_index[value], ids)
+                    category_index[value] = ids
+
+    ##################
+    # Public Methods #
+    ##################
+    def getNodes(self, node_type=None, **values):
+        """ Names of the nodes whose components match every category=value given,
+            e.g. getNodes('country, age, sex', country='Albania', sex='male')
+        """
+        return self.labels[self.__getMatchingIds(node_type, values)].tolist()
+
+    def getNeighbors(self, node, neighbor_type=None, min_weight=None, limit=None):
+        """ (neighbour, weight) pairs of a node by decreasing weight, optionally only of neighbor_type,
+            with weight >= min_weight, and at most limit of them
+        """
+        neighbors, weights = self.__getEdges(self.__getId(node), min_weight)
+        return self.__selectNeighbors(neighbors, weights, neighbor_type, limit)
+
+    def getNeighborsByValue(self, node_type=None, neighbor_type=None, min_weight=None, limit=None, **values):
+        """ Neighbours of all the nodes matching the category values (see getNodes), with the weights
+            summed over those nodes, e.g. all suicides_per_100k_bins neighbours of country X with
+            weight >= k: getNeighborsByValue(neighbor_type='suicides_per_100k_bins', min_weight=k, country=X)
+        """
+        node_ids = self.__getMatchingIds(node_type, values)
+        if len(node_ids) == 1:
+            neighbors, weights = self.__getEdges(node_ids[0], min_weight)
+            return self.__selectNeighbors(neighbors, weights, neighbor_type, limit)
+        # Positions of the edges of all the nodes, without a Python loop over the nodes
+        starts = self.indptr[node_ids]
+        lengths = self.indptr[node_ids + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        neighbors = self.neighbors[positions]
+        weights = self.neighbor_weights[positions]
+        if neighbor_type is not None:
+            keep = self.__getTypeMask(neighbor_type)[neighbors]
+            neighbors, weights = neighbors[keep], weights[keep]
+        neighbors, inverse = np.unique(neighbors, return_inverse=True)
+        weights = np.bincount(inverse, weights, minlength=len(neighbors))
+        if min_weight is not None:
+            keep = weights >= min_weight
+            neighbors, weights = neighbors[keep], weights[keep]
+        order = np.argsort(-weights, kind='stable')
+        return self.__selectNeighbors(neighbors[order], weights[order], None, limit)
+
+    def getTopNodes(self, node_type, limit=10, neighbor_of=None, **values):
+        """ (node, weighted degree) pairs of the limit nodes of node_type with the largest weighted degree,
+            optionally only those matching the category values or adjacent to the node neighbor_of
+        """
+        type_mask = self.__getTypeMask(node_type)
+        if neighbor_of is None and len(values) == 0:
+            node_ids = self.type_rankings[node_type][:limit]
+        else:
+            if neighbor_of is None:
+                node_ids = self.__getMatchingIds(node_type, values)
+            else:
+                neighbor_id = self.__getId(neighbor_of)
+                node_ids = np.sort(self.neighbors[self.indptr[neighbor_id]:self.indptr[neighbor_id + 1]])
+                node_ids = node_ids[type_mask[node_ids]]
+                if len(values) > 0:
+                    node_ids = self.__intersect([node_ids] + self.__getValueIds(values))
+            if len(node_ids) > limit:
+                node_ids = node_ids[np.argpartition(-self.weighted_degrees[node_ids], limit - 1)[:limit]]
+            node_ids = node_ids[np.argsort(-self.weighted_degrees[node_ids], kind='stable')]
+        return list(zip(self.labels[node_ids].tolist(), self.weighted_degrees[node_ids].tolist()))
+
+    def getWeightedDegree(self, node):
+        return float(self.weighted_degrees[self.__getId(node)])
+
+    ###################
+    # Private Methods #
+    ###################
+    @staticmethod
+    def __getComponents(label, type_values, categories):
+        """ The category values of the node label """
+        if label in type_values:
+            return type_values[label]
+        parts = label.split(', ')
+        if len(parts) != len(categories): raise ValueError(label)
+        return parts
+
+    @staticmethod
+    def __groupIds(values, node_ids):
+        """ Dictionary from each value to the sorted node ids that have it """
+        order = np.argsort(values.astype(str), kind='stable')
+        values, node_ids = values[order], node_ids[order]
+        boundaries = np.flatnonzero(values[1:] != values[:-1]) + 1
+        groups = dict()
+        for start, end in zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(values)]])):
+            if values[start] is not None:
+                groups[values[start]] = np.sort(node_ids[start:end])
+        return groups
+
+    def __getId(self, node):
+        if node not in self.__ids: raise KeyError(node)
+        return self.__ids[node]
+
+    def __getTypeMask(self, node_type):
+        if node_type not in self.type_masks: raise ValueError
+        return self.type_masks[node_type]
+
+    def __getValueIds(self, values):
+        """ The sorted node ids of every category=value """
+        value_ids = []
+        for category, value in values.items():
+            if category not in self.value_index: raise ValueError
+            value_ids += [self.value_index[category].get(str(value), np.zeros(0, dtype=np.int64))]
+        return value_ids
+
+    @staticmethod
+    def __intersect(id_arrays):
+        """ Intersection of sorted id arrays, looking the smallest one up in the others """
+        id_arrays = sorted(id_arrays, key=len)
+        node_ids = id_arrays[0]
+        for ids in id_arrays[1:]:
+            if len(ids) == 0:
+                return ids
+            positions = np.minimum(np.searchsorted(ids, node_ids), len(ids) - 1)
+            node_ids = node_ids[ids[positions] == node_ids]
+        return node_ids
+
+    def __getMatchingIds(self, node_type, values):
+        if len(values) == 0:
+            if node_type is None: raise ValueError
+            return np.flatnonzero(self.__getTypeMask(node_type))
+        node_ids = self.__intersect(self.__getValueIds(values))
+        if node_type is not None:
+            node_ids = node_ids[self.__getTypeMask(node_type)[node_ids]]
+        return node_ids
+
+    def __getEdges(self, node_id, min_weight):
+        start, end = self.indptr[node_id], self.indptr[node_id + 1]
+        if min_weight is not None:
+            # Weights are decreasing within the row
+            end = start + np.searchsorted(-self.neighbor_weights[start:end], -min_weight, side='right')
+        return self.neighbors[start:end], self.neighbor_weights[start:end]
+
+    def __selectNeighbors(self, neighbors, weights, node_type, limit):
+        if node_type is not None:
+            keep = self.__getTypeMask(node_type)[neighbors]
+            neighbors, weights = neighbors[keep], weights[keep]
+        if limit is not None:
+            neighbors, weights = neighbors[:limit], weights[:limit]
+        return list(zip(self.labels[neighbors].tolist(), weights.tolist()))
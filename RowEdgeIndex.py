@@ -0,0 +1,103 @@
+""" Filtered views of a built graph, selected by predicates on its source rows.
+    Every edge weight is a count of the rows that contain both end nodes, so
+    the index is a sparse rows x edges matrix holding what each row adds to
+    each edge. The graph of any subset of the rows (a rate threshold, a year
+    range, a set of countries, ...) is then one sparse product of a row mask
+    with that matrix, instead of writing the rows to a new csv and building
+    the graph from it again.
+
+    A filtered graph holds the nodes of the edges that keep some weight, so
+    it is the graph GraphManager would build from the selected rows.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from CompactGraph import CompactGraph
+
+
+class RowEdgeIndex:
+    def __init__(self, labels, rows, edge_frame, directed=False):
+        """ labels is the node table and rows the source rows (at least the columns used in predicates).
+            edge_frame has columns row, source, target, weight with what every row (a position in rows)
+            adds to every edge (see GraphManager.getRowEdgeIndex).
+        """
+        self.labels = np.asarray(labels, dtype=object)
+        self.rows = rows.reset_index(drop=True)
+        self.directed = directed
+        index = pd.Index(self.labels, dtype=object)
+        sources = index.get_indexer(pd.Index(edge_frame['source'], dtype=object))
+        targets = index.get_indexer(pd.Index(edge_frame['target'], dtype=object))
+        if (sources < 0).any() or (targets < 0).any(): raise ValueError
+        edge_ids, edge_codes = np.unique(sources.astype(np.int64) * len(self.labels) + targets, return_inverse=True)
+        self.sources = (edge_ids // len(self.labels)).astype(np.int32)
+        self.targets = (edge_ids % len(self.labels)).astype(np.int32)
+        # Stored edges x rows, so the weights of a row mask are a product with the CSR rows
+        self.contributions = sparse.csr_matrix((edge_frame['weight'].to_numpy(dtype=np.float64),
+                                                (edge_codes, edge_frame['row'].to_numpy())),
+                                               shape=(len(edge_ids), len(self.rows)))
+
+    ##################
+    # Public Methods #
+    ##################
+    def getRowMask(self, min_rate=None, max_rate=None, years=None, countries=None, predicate=None,
+                   rate_category='suicides_per_100k', **values):
+        """ Boolean mask of the rows with min_rate <= rate <= max_rate, a year in the inclusive range
+            years=(start, end), a country in countries, predicate(rows) true (a function returning a
+            boolean array), and category=value (or a list of values) for every keyword in values
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        if min_rate is not None:
+            mask &= (self.__getColumn(rate_category) >= min_rate).to_numpy()
+        if max_rate is not None:
+            mask &= (self.__getColumn(rate_category) <= max_rate).to_numpy()
+        if years is not None:
+            mask &= self.__getColumn('year').between(years[0], years[1]).to_numpy()
+        if countries is not None:
+            values['country'] = list(countries)
+        for category, value in values.items():
+            value = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            mask &= self.__getColumn(category).isin(list(value)).to_numpy()
+        if predicate is not None:
+            mask &= np.asarray(predicate(self.rows), dtype=bool)
+        return mask
+
+    def getEdgeWeights(self, mask=None):
+        """ Weight of every edge counted over the rows selected by mask (default all rows) """
+        if mask is None:
+            mask = np.ones(len(self.rows), dtype=bool)
+        return self.contributions @ np.asarray(mask, dtype=np.float64)
+
+    def getGraph(self, mask=None, **predicates):
+        """ The graph of the rows selected by mask, or by the predicates of getRowMask, as a CompactGraph """
+        if mask is None:
+            mask = self.getRowMask(**predicates)
+        weights = self.getEdgeWeights(mask)
+        present = weights > 0
+        sources, targets = self.sources[present], self.targets[present]
+        node_ids = np.unique(np.concatenate([sources, targets]))
+        positions = np.full(len(self.labels), -1, dtype=np.int64)
+        positions[node_ids] = np.arange(len(node_ids))
+        shape = (len(node_ids), len(node_ids))
+        adjacency = sparse.coo_matrix((weights[present], (positions[sources], positions[targets])),
+                                      shape=shape).tocsr()
+        if not self.directed:
+            adjacency = adjacency + adjacency.T - sparse.diags(adjacency.diagonal())
+        return CompactGraph(self.directed, self.labels[node_ids], adjacency)
+
+    def getMemoryUsage(self):
+        """ Bytes held by the index arrays (the rows are shared with the database) """
+        return self.contributions.data.nbytes + self.contributions.indices.nbytes + \
+            self.contributions.indptr.nbytes + self.sources.nbytes + self.targets.nbytes
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getColumn(self, category):
+        if category not in self.rows.columns: raise ValueError
+        return self.rows[category]
@@ -1,8 +1,6 @@
 # Run_v2.py. Place that Jonathan uses to experiment with code.
 from GraphDatabaseManager_v2 import GraphManager
-import networkx as nx
-from matplotlib import pyplot as plt
-import numpy as np
+from GraphRenderer import GraphRenderer
 from DatabaseManager import DatabaseManager
 
 
@@ -19,40 +17,28 @@ def main():
     del database
 
     # Extract a knowledge graph
-    graph_database = GraphManager('datasets/suicide_rates_by_category.csv')
+    renderer = GraphRenderer('figures')
+    legend = [('y', 'Country, Age, Sex'), ('m', 'Suicide Bin')]
+    graph_database = GraphManager('datasets/suicide_rates_by_category.csv', cache_dir='cache')
     G = graph_database.getGraph_of_Database()
     G = graph_database.extractLargestComponent(G)  # let's only worry about the largest component!
-    pos = nx.nx_agraph.graphviz_layout(G, prog='neato')
     # I edited the following function to use any graph (ie the largest component) by default will use the whole graph
     color_map = graph_database.getColormap_by_Nodetype(G)
 
-    # Plot figure of largest component
-    plt.figure(1)
-    nx.draw_networkx(G, pos, node_color=color_map, alpha=0.8, node_size=40, with_labels=False)
-    ax = plt.gca()
-    age_line, = ax.plot(-np.inf, -np.inf, 'y.', markersize=10)
-    age_line.set_label('Country, Age, Sex')
-    year_line, = ax.plot(-np.inf, -np.inf, 'm.', markersize=10)
-    year_line.set_label('Suicide Bin')
-    ax.legend()
-    plt.show()
+    # Plot figure of largest component. The layout runs in the background while the projection is computed
+    renderer.drawGraph(G, 'SuicideRiskGraph_largest_component.png', node_color=color_map, legend=legend)
 
     H = graph_database.extractProjectionGraph('country, age, sex')
     H = graph_database.extractLargestComponent(H)  # let's only worry about the largest component!
-    pos = nx.nx_agraph.graphviz_layout(H, prog='neato')
     # I edited the following function to use any graph (ie the largest component) by default will use the whole graph
     color_map = graph_database.getColormap_by_Nodetype(H)
 
     # Plot figure of largest component
-    plt.figure(1)
-    nx.draw_networkx(H, pos, node_color=color_map, alpha=0.8, node_size=40, with_labels=False)
-    ax = plt.gca()
-    age_line, = ax.plot(-np.inf, -np.inf, 'y.', markersize=10)
-    age_line.set_label('Country, Age, Sex')
-    year_line, = ax.plot(-np.inf, -np.inf, 'm.', markersize=10)
-    year_line.set_label('Suicide Bin')
-    ax.legend()
-    plt.show()
-
-
-main()
+    renderer.drawGraph(H, 'SuicideRiskGraph_projection.png', node_color=color_map, legend=legend)
+    for path in renderer.wait():
+        print("wrote", path)
+    renderer.close()
+
+
+if __name__ == '__main__':
+    main()
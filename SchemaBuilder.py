@@ -0,0 +1,98 @@
+""" Builds graphs for many node_types schemas at once.
+    The csv is parsed, cleaned, binned and encoded as integer category codes a
+    single time. The code arrays are placed in shared memory, and a pool of
+    worker processes builds one GraphDatabaseManager_v2 graph per schema from
+    them, so the work for N schemas is spread over the available cores.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from DatabaseManager import DatabaseManager, default_binlist
+from GraphDatabaseManager_v2 import GraphManager
+
+# Columns attached by a worker process: name -> (shared memory block, Categorical column)
+_worker_columns = dict()
+
+
+class SchemaBuilder:
+    def __init__(self, file_name, binlist=default_binlist):
+        self.database = DatabaseManager(file_name, categorical=True, binlist=binlist)
+
+    ##################
+    # Public Methods #
+    ##################
+    def buildGraphs(self, schemas, processes=None, summary_only=False):
+        """ Returns one result per schema, in order. A result is the networkx graph, or with
+            summary_only=True a dictionary of summary metrics (see getSummary).
+        """
+        if processes is None:
+            processes = os.cpu_count()
+        categories = sorted({category for schema in schemas for node_type in schema for category in node_type})
+        blocks, specs = self.__shareColumns(categories)
+        try:
+            with ProcessPoolExecutor(max_workers=processes, initializer=_attachColumns, initargs=(specs,)) as pool:
+                results = list(pool.map(_buildSchema, schemas, [summary_only] * len(schemas)))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return results
+
+    @staticmethod
+    def getSummary(G):
+        components = list(nx.connected_components(G)) if not G.is_directed() else \
+            list(nx.weakly_connected_components(G))
+        return {'nodes': G.number_of_nodes(),
+                'edges': G.number_of_edges(),
+                'density': nx.density(G),
+                'components': len(components),
+                'largest_component': max((len(c) for c in components), default=0),
+                'total_weight': G.size(weight='weight')}
+
+    ###################
+    # Private Methods #
+    ###################
+    def __shareColumns(self, categories):
+        """ Copies the integer codes of each column into its own shared memory block """
+        blocks = []
+        specs = dict()
+        for category in categories:
+            column = self.database.dataframe[category]
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype('category')
+            codes = column.cat.codes.to_numpy()
+            block = shared_memory.SharedMemory(create=True, size=max(codes.nbytes, 1))
+            np.ndarray(codes.shape, dtype=codes.dtype, buffer=block.buf)[:] = codes
+            blocks += [block]
+            specs[category] = (block.name, codes.shape, codes.dtype.str, column.cat.categories)
+        return blocks, specs
+
+
+#############################
+# Worker Process Functions  #
+#############################
+def _attachColumns(specs):
+    for category, (name, shape, dtype, labels) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        codes = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        _worker_columns[category] = (block, pd.Categorical.from_codes(codes, categories=labels))
+
+
+def _buildSchema(schema, summary_only):
+    columns = {category: _worker_columns[category][1] for node_type in schema for category in node_type}
+    database = DatabaseManager.fromDataframe(pd.DataFrame(columns))
+    graph_database = GraphManager(None, node_types=schema, categorical=True, database=database)
+    G = graph_database.getGraph_of_Database()
+    if summary_only:
+        return SchemaBuilder.getSummary(G)
+    return G
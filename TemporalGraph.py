@@ -0,0 +1,106 @@
+""" Time-sliced edge weights over one shared node table.
+    Every edge that occurs in any year gets one id, and the weights are held
+    in a sparse times x edges matrix (row t holds the weight of every edge in
+    the t-th year), built in a single pass over the rows. A snapshot or a
+    window of years is a sum of rows of that matrix, and per-year analytics
+    (degree trajectories, weight deltas) are sparse products with the
+    edges x nodes incidence matrix, so no per-year graph is ever built.
+
+    Snapshots are CompactGraphs over the full node table, so node ids agree
+    across years; call toNetworkx on one when a networkx graph is needed.
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from CompactGraph import CompactGraph
+
+
+class TemporalGraph:
+    def __init__(self, labels, edge_frame, directed=False):
+        """ labels is the node table. edge_frame has columns time, source, target, weight
+            with one row per edge and time (see GraphManager.getTemporalGraph).
+        """
+        self.labels = np.asarray(labels, dtype=object)
+        self.directed = directed
+        self.times, time_codes = np.unique(edge_frame['time'].to_numpy(), return_inverse=True)
+        index = pd.Index(self.labels, dtype=object)
+        sources = index.get_indexer(pd.Index(edge_frame['source'], dtype=object))
+        targets = index.get_indexer(pd.Index(edge_frame['target'], dtype=object))
+        if (sources < 0).any() or (targets < 0).any(): raise ValueError
+        edge_ids, edge_codes = np.unique(sources.astype(np.int64) * len(self.labels) + targets, return_inverse=True)
+        self.sources = (edge_ids // len(self.labels)).astype(np.int32)
+        self.targets = (edge_ids % len(self.labels)).astype(np.int32)
+        self.weights = sparse.csr_matrix((edge_frame['weight'].to_numpy(dtype=np.float64), (time_codes, edge_codes)),
+                                         shape=(len(self.times), len(edge_ids)))
+
+    ##################
+    # Public Methods #
+    ##################
+    def getEdgeWeights(self, start=None, end=None):
+        """ Weight of every edge summed over the times from start to end (inclusive, default all) """
+        return np.asarray(self.weights[self.__getTimeRows(start, end)].sum(axis=0)).ravel()
+
+    def getSnapshot(self, time):
+        """ The graph of one time (year) as a CompactGraph """
+        return self.getWindow(time, time)
+
+    def getWindow(self, start, end):
+        """ The graph of the times from start to end (inclusive), e.g. getWindow(1990, 1995) """
+        weights = self.getEdgeWeights(start, end)
+        present = weights > 0
+        num_nodes = len(self.labels)
+        adjacency = sparse.coo_matrix((weights[present], (self.sources[present], self.targets[present])),
+                                      shape=(num_nodes, num_nodes)).tocsr()
+        if not self.directed:
+            adjacency = adjacency + adjacency.T - sparse.diags(adjacency.diagonal())
+        return CompactGraph(self.directed, self.labels, adjacency)
+
+    def getDegreeTrajectories(self, weighted=False):
+        """ times x nodes array of the degree (or weighted degree) of every node in every time """
+        weights = self.weights if weighted else self.__getPattern(self.weights)
+        return np.asarray((weights @ self.__getIncidence()).todense())
+
+    def getWeightDeltas(self):
+        """ (times - 1) x edges sparse matrix of the change of every edge weight from one time to the next """
+        return sparse.csr_matrix(self.weights[1:] - self.weights[:-1])
+
+    def getEdgeCounts(self):
+        """ Number of edges present in every time """
+        return np.diff(self.weights.indptr)
+
+    def getTotalWeights(self):
+        return np.asarray(self.weights.sum(axis=1)).ravel()
+
+    def getMemoryUsage(self):
+        return self.weights.data.nbytes + self.weights.indices.nbytes + self.weights.indptr.nbytes + \
+            self.sources.nbytes + self.targets.nbytes + self.times.nbytes + self.labels.nbytes
+
+    ###################
+    # Private Methods #
+    ###################
+    def __getTimeRows(self, start, end):
+        rows = np.ones(len(self.times), dtype=bool)
+        if start is not None:
+            rows &= self.times >= start
+        if end is not None:
+            rows &= self.times <= end
+        return np.flatnonzero(rows)
+
+    def __getIncidence(self):
+        """ edges x nodes matrix with a one at both ends of every edge (a self loop counts twice) """
+        num_edges = len(self.sources)
+        rows = np.concatenate([np.arange(num_edges), np.arange(num_edges)])
+        columns = np.concatenate([self.sources, self.targets])
+        return sparse.csr_matrix((np.ones(2 * num_edges), (rows, columns)), shape=(num_edges, len(self.labels)))
+
+    @staticmethod
+    def __getPattern(M):
+        pattern = sparse.csr_matrix(M, copy=True)
+        pattern.data = np.ones_like(pattern.data)
+        return pattern
@@ -2,6 +2,10 @@
 
 # TODO: copy ChoosingGraphSchema last cell, but with few columns
 import pandas as pd
+
+from DatabaseManager import default_binlist
+from PreprocessingPipeline import PreprocessingPipeline
+
 data = pd.read_csv('datasets/suicide_rates_by_category.csv')
 # TODO: turn suicides/100k pop into suicide buckets
 
@@ -15,27 +19,13 @@ data = pd.read_csv('datasets/suicide_rates_by_category.csv')
 # 150-300       14
 
 ageRateGdp = data[['country', 'year', 'age', 'suicides/100k pop', 'gdp_per_capita ($)']]
-ageRateGdp['suicide bucket'] = '0-25'
-
-highRisk = pd.DataFrame()
-
-for index in ageRateGdp.index:
-    rowSuicideRate = ageRateGdp['suicides/100k pop'][index]
-    if rowSuicideRate < 25:
-        ageRateGdp['suicide bucket'][index] = '0-25'
-    elif rowSuicideRate < 75:
-        ageRateGdp['suicide bucket'][index] = '25-75'
-    elif rowSuicideRate < 100:
-        ageRateGdp['suicide bucket'][index] = '75-100'
-    elif rowSuicideRate < 125:
-        ageRateGdp['suicide bucket'][index] = '100-125'
-    elif rowSuicideRate < 150:
-        ageRateGdp['suicide bucket'][index] = '125-150'
-    elif rowSuicideRate > 150:
-        ageRateGdp['suicide bucket'][index] = '150-300'
-    if rowSuicideRate > 100:
-        entry = ageRateGdp.loc[ageRateGdp['suicide bucket'] == '150-300']
-        highRisk = pd.concat([highRisk, entry])
+
+# One vectorized pass buckets every row, and the high risk rows are selected with one filter.
+# Buckets hold their lower edge (a rate of 25 is in 25-75) and high risk means a rate above 100.
+buckets = PreprocessingPipeline(bins={'suicides/100k pop': {'edges': list(default_binlist), 'name': 'suicide bucket',
+                                                            'right': False}})
+ageRateGdp = buckets.apply(ageRateGdp)
+highRisk = PreprocessingPipeline(filters=[{'column': 'suicides/100k pop', 'above': 100}]).apply(ageRateGdp)
 print(highRisk.to_string())
 
 # TODO: only graph lowest suicide bucket
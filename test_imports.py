@@ -0,0 +1,38 @@
+""" Startup checks for headless jobs: importing the graph modules must not
+    load matplotlib or pygraphviz, and must stay within the import time
+    budget of ImportBudget.py. Every import runs in a fresh interpreter.
+
+    python -m unittest test_imports
+
+    CS 575 Class
+    Brigham Young University
+
+    April 2023
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+from ImportBudget import getImportTime, headless_modules, import_time_budget
+
+
+class TestImports(unittest.TestCase):
+    def test_no_plotting_modules(self):
+        for module in headless_modules:
+            script = ("import sys\nimport " + module + "\n"
+                      "print(' '.join(sorted({name.split('.')[0] for name in sys.modules} & "
+                      "{'matplotlib', 'pygraphviz'})))")
+            output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            self.assertEqual(output.stdout.split(), [], module + " loads plotting modules")
+
+    def test_import_time_budget(self):
+        seconds, plotting = getImportTime(headless_modules)
+        self.assertEqual(plotting, [])
+        self.assertLessEqual(seconds, import_time_budget,
+                             "importing {} took {:.3f} s".format(", ".join(headless_modules), seconds))
+
+
+if __name__ == '__main__':
+    unittest.main()